@@ -0,0 +1,405 @@
+"""
+Numba kernels for the pixel statistics hot paths in analyze.py.
+
+The kernels are JIT-compiled (parallel, fastmath) by warm_up() or on first
+call and cached on disk where possible. Without numba HAVE_NUMBA is False and
+callers fall back to their NumPy implementation.
+"""
+
+import contextlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+# numba caches compiled kernels in __pycache__ next to this file, else in the
+# user's cache directory. Read-only deployments often allow neither, and then
+# cache=True fails at import ("no locator available"): use the temp dir there.
+if 'NUMBA_CACHE_DIR' not in os.environ and not os.access(os.path.dirname(os.path.abspath(__file__)), os.W_OK):
+    os.environ['NUMBA_CACHE_DIR'] = os.path.join(tempfile.gettempdir(), 'numba_cache')
+
+try:
+    import numba
+    from numba import njit, prange
+    # Kernels run on request worker threads (asyncio.to_thread). OpenMP is
+    # thread-safe and, unlike TBB started off the main thread, doesn't hang
+    # interpreter shutdown; NUMBA_THREADING_LAYER still overrides this.
+    numba.config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - depends on deployment
+    HAVE_NUMBA = False
+    prange = range
+
+HAVE_LUT_KERNEL = HAVE_NUMBA
+HAVE_DEMOSAIC_STATS_KERNEL = HAVE_NUMBA
+
+
+def fused_stats_rows_py(arr):
+    """
+    One pass over an (H, W, 3) RGB array. Each row writes its own partial
+    results so the prange loop needs no shared accumulators.
+
+    row_sums[y] = (sum_r, sum_g, sum_b, sum_rc, sum_rc^2, sum_gc, sum_gc^2, n_chrom)
+    row_max[y]  = (max_r, max_g, max_b)
+    """
+    height, width = arr.shape[0], arr.shape[1]
+    row_sums = np.zeros((height, 8), dtype=np.float64)
+    row_max = np.zeros((height, 3), dtype=np.float64)
+    for y in prange(height):
+        sum_r = 0.0
+        sum_g = 0.0
+        sum_b = 0.0
+        s1r = 0.0
+        s2r = 0.0
+        s1g = 0.0
+        s2g = 0.0
+        n = 0.0
+        max_r = 0.0
+        max_g = 0.0
+        max_b = 0.0
+        for x in range(width):
+            r = float(arr[y, x, 0])
+            g = float(arr[y, x, 1])
+            b = float(arr[y, x, 2])
+            sum_r += r
+            sum_g += g
+            sum_b += b
+            if r > max_r:
+                max_r = r
+            if g > max_g:
+                max_g = g
+            if b > max_b:
+                max_b = b
+            s = r + g + b
+            if s > 0.0:
+                rc = r / s
+                gc = g / s
+                s1r += rc
+                s2r += rc * rc
+                s1g += gc
+                s2g += gc * gc
+                n += 1.0
+        row_sums[y, 0] = sum_r
+        row_sums[y, 1] = sum_g
+        row_sums[y, 2] = sum_b
+        row_sums[y, 3] = s1r
+        row_sums[y, 4] = s2r
+        row_sums[y, 5] = s1g
+        row_sums[y, 6] = s2g
+        row_sums[y, 7] = n
+        row_max[y, 0] = max_r
+        row_max[y, 1] = max_g
+        row_max[y, 2] = max_b
+    return row_sums, row_max
+
+
+def lut_stats_rows_py(arr, lut):
+    """
+    fused_stats_rows_py for integer pixels mapped through lut first
+    (value = lut[pixel], e.g. the sRGB -> linear transfer curve), so the
+    linearized values are never stored.
+    """
+    height, width = arr.shape[0], arr.shape[1]
+    row_sums = np.zeros((height, 8), dtype=np.float64)
+    row_max = np.zeros((height, 3), dtype=np.float64)
+    for y in prange(height):
+        sum_r = 0.0
+        sum_g = 0.0
+        sum_b = 0.0
+        s1r = 0.0
+        s2r = 0.0
+        s1g = 0.0
+        s2g = 0.0
+        n = 0.0
+        max_r = 0.0
+        max_g = 0.0
+        max_b = 0.0
+        for x in range(width):
+            r = lut[arr[y, x, 0]]
+            g = lut[arr[y, x, 1]]
+            b = lut[arr[y, x, 2]]
+            sum_r += r
+            sum_g += g
+            sum_b += b
+            if r > max_r:
+                max_r = r
+            if g > max_g:
+                max_g = g
+            if b > max_b:
+                max_b = b
+            s = r + g + b
+            if s > 0.0:
+                rc = r / s
+                gc = g / s
+                s1r += rc
+                s2r += rc * rc
+                s1g += gc
+                s2g += gc * gc
+                n += 1.0
+        row_sums[y, 0] = sum_r
+        row_sums[y, 1] = sum_g
+        row_sums[y, 2] = sum_b
+        row_sums[y, 3] = s1r
+        row_sums[y, 4] = s2r
+        row_sums[y, 5] = s1g
+        row_sums[y, 6] = s2g
+        row_sums[y, 7] = n
+        row_max[y, 0] = max_r
+        row_max[y, 1] = max_g
+        row_max[y, 2] = max_b
+    return row_sums, row_max
+
+
+def _plane(cfa, site, channel, y, x):
+    """CFA value at (y, x) if that site samples channel, else 0 (one colour plane)."""
+    if site[y % 2, x % 2] == channel:
+        return cfa[y, x]
+    return 0.0
+
+
+def _red_blue(cfa, site, channel, other, same_row, c, y, yu, yd, x, xl, xr):
+    """
+    Bilinear red (channel 0, other 2) or blue (channel 2, other 0) value at
+    (y, x), a site sampling c; same_row is y % 2 of the rows containing channel.
+    """
+    if c == channel:
+        return float(cfa[y, x])
+    if c == other:
+        return (_plane(cfa, site, channel, yu, xl) + _plane(cfa, site, channel, yu, xr)
+                + _plane(cfa, site, channel, yd, xl) + _plane(cfa, site, channel, yd, xr)) / 4
+    if y % 2 == same_row:
+        return (_plane(cfa, site, channel, y, xl) + _plane(cfa, site, channel, y, xr)) / 2
+    return (_plane(cfa, site, channel, yu, x) + _plane(cfa, site, channel, yd, x)) / 2
+
+
+def _green(cfa, site, c, y, yu, yd, x, xl, xr):
+    """Bilinear green value at (y, x), a site sampling c."""
+    if c == 1:
+        return float(cfa[y, x])
+    return (_plane(cfa, site, 1, yu, x) + _plane(cfa, site, 1, yd, x)
+            + _plane(cfa, site, 1, y, xl) + _plane(cfa, site, 1, y, xr)) / 4
+
+
+def _bilinear_rgb(cfa, site, r_row, b_row, width, y, yu, yd, x, xl, xr):
+    """
+    (R, G, B) at (y, x), with yu / yd the rows above / below. Away from the
+    edges every neighbour of a Bayer site has the colour the stencil expects,
+    so the interpolation reduces to the horizontal, vertical and diagonal
+    neighbour means picked by the site alone, without checking each
+    neighbour's colour. Edge pixels, whose wrapped neighbours can land on the
+    wrong colour, take the general per-neighbour path.
+    """
+    c = site[y % 2, x % 2]
+    if yu == y - 1 and yd == y + 1 and 0 < x < width - 1:
+        centre = float(cfa[y, x])
+        h = (float(cfa[y, xl]) + float(cfa[y, xr])) / 2
+        v = (float(cfa[yu, x]) + float(cfa[yd, x])) / 2
+        if c == 1:
+            if y % 2 == r_row:
+                return h, centre, v
+            return v, centre, h
+        d = (float(cfa[yu, xl]) + float(cfa[yu, xr]) + float(cfa[yd, xl]) + float(cfa[yd, xr])) / 4
+        if c == 0:
+            return centre, (h + v) / 2, d
+        return d, (h + v) / 2, centre
+    return (_red_blue(cfa, site, 0, 2, r_row, c, y, yu, yd, x, xl, xr),
+            _green(cfa, site, c, y, yu, yd, x, xl, xr),
+            _red_blue(cfa, site, 2, 0, b_row, c, y, yu, yd, x, xl, xr))
+
+
+def demosaic_stats_rows_py(cfa, site, r_row, b_row, rows, rows_up, rows_down):
+    """
+    Bilinear demosaic (ImageAnalyzer.demosaic_strip) fused with
+    fused_stats_rows_py: demosaics the given rows of a whole CFA frame pixel
+    by pixel and only keeps the per-row statistics, so no RGB is ever stored.
+    Row rows[k] is interpolated with rows rows_up[k] / rows_down[k] above /
+    below it; columns wrap around the frame edges.
+
+    site[y % 2, x % 2]: channel sampled at (y, x), 0 = R, 1 = G, 2 = B
+    r_row / b_row: y % 2 of the rows containing red / blue sites
+
+    row_sums[k] / row_max[k] hold the statistics of row rows[k] (see
+    fused_stats_rows_py).
+    """
+    width = cfa.shape[1]
+    n_rows = rows.shape[0]
+    row_sums = np.zeros((n_rows, 8), dtype=np.float64)
+    row_max = np.zeros((n_rows, 3), dtype=np.float64)
+    for k in prange(n_rows):
+        y = rows[k]
+        yu = rows_up[k]
+        yd = rows_down[k]
+        sum_r = 0.0
+        sum_g = 0.0
+        sum_b = 0.0
+        s1r = 0.0
+        s2r = 0.0
+        s1g = 0.0
+        s2g = 0.0
+        n = 0.0
+        max_r = 0.0
+        max_g = 0.0
+        max_b = 0.0
+        for x in range(width):
+            xl = (x - 1) % width
+            xr = (x + 1) % width
+            r, g, b = _bilinear_rgb(cfa, site, r_row, b_row, width, y, yu, yd, x, xl, xr)
+            sum_r += r
+            sum_g += g
+            sum_b += b
+            if r > max_r:
+                max_r = r
+            if g > max_g:
+                max_g = g
+            if b > max_b:
+                max_b = b
+            s = r + g + b
+            if s > 0.0:
+                rc = r / s
+                gc = g / s
+                s1r += rc
+                s2r += rc * rc
+                s1g += gc
+                s2g += gc * gc
+                n += 1.0
+        row_sums[k, 0] = sum_r
+        row_sums[k, 1] = sum_g
+        row_sums[k, 2] = sum_b
+        row_sums[k, 3] = s1r
+        row_sums[k, 4] = s2r
+        row_sums[k, 5] = s1g
+        row_sums[k, 6] = s2g
+        row_sums[k, 7] = n
+        row_max[k, 0] = max_r
+        row_max[k, 1] = max_g
+        row_max[k, 2] = max_b
+    return row_sums, row_max
+
+
+if HAVE_NUMBA:
+    _fused_stats_rows = njit(parallel=True, fastmath=True, cache=True)(fused_stats_rows_py)
+    # One dispatcher per pixel dtype, so each compiles only its own signature
+    _lut_stats_rows = {np.dtype(dtype): njit(parallel=True, fastmath=True, cache=True)(lut_stats_rows_py)
+                       for dtype in (np.uint8, np.uint16)}
+    _plane = njit(inline='always')(_plane)
+    _red_blue = njit(inline='always')(_red_blue)
+    _green = njit(inline='always')(_green)
+    _bilinear_rgb = njit(inline='always')(_bilinear_rgb)
+    _demosaic_stats_rows = njit(parallel=True, fastmath=True, cache=True)(demosaic_stats_rows_py)
+
+
+_COMPILE_LOCK = threading.Lock()
+_compiled_kernels = set()
+_WORKQUEUE_LOCK = threading.Lock()
+
+
+def _readonly(dtype, ndim):
+    """numba type of a read-only array of any layout."""
+    return numba.types.Array(numba.from_dtype(np.dtype(dtype)), ndim, 'A', readonly=True)
+
+
+def _compiled(kernel, *argtypes):
+    """
+    kernel, compiled (or loaded from numba's disk cache) for argtypes alone.
+    Writable and contiguous arrays convert to the read-only, any-layout array
+    types, so read-only np.asarray(PIL image) pixels, strided sampled views
+    and plain arrays all share this one version instead of compiling their own.
+    """
+    if kernel not in _compiled_kernels:
+        with _COMPILE_LOCK:
+            if kernel not in _compiled_kernels:
+                kernel.compile(argtypes)
+                kernel.disable_compile()
+                _compiled_kernels.add(kernel)
+    return kernel
+
+
+def _lut_kernel(dtype):
+    return _compiled(_lut_stats_rows[np.dtype(dtype)], _readonly(dtype, 3), _readonly(np.float64, 1))
+
+
+def _demosaic_stats_kernel():
+    index = _readonly(np.int64, 1)
+    return _compiled(_demosaic_stats_rows, _readonly(np.uint16, 2), _readonly(np.int64, 2),
+                     numba.int64, numba.int64, index, index, index)
+
+
+def _launch_guard():
+    """
+    Context manager to launch a parallel kernel in. Without OpenMP or TBB numba
+    falls back to its workqueue threading layer, which aborts the process when
+    two request threads launch kernels at once, so launches are serialized
+    there (and before the first launch, while the layer is still unknown).
+    """
+    try:
+        layer = numba.threading_layer()
+    except ValueError:  # no parallel kernel launched yet
+        layer = None
+    return _WORKQUEUE_LOCK if layer in (None, 'workqueue') else contextlib.nullcontext()
+
+
+def fused_stats(arr: np.ndarray, lut: np.ndarray = None):
+    """
+    Return (channel_sum[3], channel_max[3], (sum_rc, sum_rc_sq, sum_gc, sum_gc_sq), n_chrom)
+    for an (H, W, 3) array. Requires a compiled kernel (check HAVE_NUMBA first).
+
+    With lut (contiguous float64, one entry per possible uint8/uint16 value)
+    the statistics are of lut[arr] instead; check HAVE_LUT_KERNEL first.
+    """
+    with _launch_guard():
+        if lut is not None:
+            row_sums, row_max = _lut_kernel(arr.dtype)(arr, lut)
+        else:
+            row_sums, row_max = _fused_stats_rows(arr)
+    return _stats_totals(row_sums, row_max)
+
+
+def _stats_totals(row_sums: np.ndarray, row_max: np.ndarray):
+    """Reduce per-row kernel statistics to the fused_stats result."""
+    totals = row_sums.sum(axis=0)
+    channel_max = row_max.max(axis=0) if row_max.shape[0] else np.zeros(3)
+    return totals[0:3], channel_max, tuple(float(v) for v in totals[3:7]), int(totals[7])
+
+
+def _site_table(pattern: np.ndarray, r_pos: tuple, b_pos: tuple, row_offset: int):
+    """(site, r_row, b_row) kernel arguments for a CFA starting at pattern row row_offset."""
+    # Site channel per (row parity, column parity); G1/G2 (1, 3) are both green
+    site = np.full((2, 2), -1, dtype=np.int64)
+    for i in range(2):
+        for j in range(2):
+            channel = pattern[(i + row_offset) % 2, j]
+            site[i, j] = 1 if channel == 3 else channel
+    r_row = (int(r_pos[0]) + row_offset) % 2
+    b_row = (int(b_pos[0]) + row_offset) % 2
+    return site, r_row, b_row
+
+
+def demosaic_stats(cfa: np.ndarray, pattern: np.ndarray, r_pos: tuple, b_pos: tuple, rows: np.ndarray,
+                   rows_up: np.ndarray, rows_down: np.ndarray):
+    """
+    fused_stats of the bilinear demosaic of the given rows of a whole uint16
+    CFA frame, without materializing any RGB. rows_up / rows_down give the
+    row above / below each of rows (see ImageAnalyzer._strip_rows). Requires
+    a compiled kernel (check HAVE_DEMOSAIC_STATS_KERNEL first).
+    """
+    site, r_row, b_row = _site_table(pattern, r_pos, b_pos, 0)
+    with _launch_guard():
+        row_sums, row_max = _demosaic_stats_kernel()(np.ascontiguousarray(cfa, dtype=np.uint16), site, r_row, b_row,
+                                                 *(np.ascontiguousarray(a, dtype=np.int64)
+                                                   for a in (rows, rows_up, rows_down)))
+    return _stats_totals(row_sums, row_max)
+
+
+def warm_up():
+    """
+    Compile (or load from numba's disk cache) the JIT kernels the analysis
+    endpoints call, so requests don't pay for it. Safe to run in a background
+    thread: a request needing a kernel still being compiled waits for it.
+    No-op without numba.
+    """
+    if not HAVE_NUMBA:
+        return
+    _lut_kernel(np.uint8)
+    _demosaic_stats_kernel()
+    _lut_kernel(np.uint16)
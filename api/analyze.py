@@ -6,16 +6,30 @@ Replicates the Flutter chromaticity and RGB analysis logic in Python
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from PIL import Image
+from PIL import Image, ExifTags
+from PIL.TiffImagePlugin import IFDRational
 import numpy as np
+import asyncio
+import contextlib
+import functools
 import io
+import logging
 import math
 import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, Any, Tuple
-import exifread
-import rawpy
-import gc  # Garbage collection for memory management
+from fractions import Fraction
+from typing import Optional, Dict, Any, Tuple, BinaryIO, Union
+from _kernels import (
+    HAVE_DEMOSAIC_STATS_KERNEL, HAVE_LUT_KERNEL, HAVE_NUMBA, demosaic_stats, fused_stats, warm_up,
+)
+
+# Debug-level progress logging is off in production; set LOG_LEVEL=DEBUG to see it
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+logger = logging.getLogger("uvsn")
 
 # Lazy-loaded Random Forest classifier and optional LabelEncoder for lamp prediction
 _LAMP_CLASSIFIER = None
@@ -103,32 +117,6 @@ def _analysis_to_feature_vector(response: Dict[str, Any]) -> np.ndarray:
 app = FastAPI()
 
 
-class NumpyImageWrapper:
-    """
-    Wrapper class that makes a numpy array behave like a PIL Image
-    This preserves 16-bit data that PIL would otherwise convert to 8-bit
-    """
-    def __init__(self, array: np.ndarray):
-        self._array = array
-        self._mode = 'RGB16' if array.dtype == np.uint16 else 'RGB'
-    
-    @property
-    def size(self):
-        """Returns (width, height) like PIL"""
-        return (self._array.shape[1], self._array.shape[0])
-    
-    @property
-    def mode(self):
-        return self._mode
-    
-    def convert(self, mode):
-        """Dummy convert - we're already RGB"""
-        return self
-    
-    def __array__(self):
-        """Allow np.array(wrapper) to work"""
-        return self._array
-
 # Enable CORS for Flutter web app
 app.add_middleware(
     CORSMiddleware,
@@ -138,6 +126,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# JIT-compile the numba kernels during the cold start rather than inside the
+# first request (a no-op without numba). With an empty numba cache that is
+# about 7 s of single-core compiling, well under a second from the cache, so
+# it runs in the background: importing this module stays within ~1 s, and a
+# request arriving earlier only waits for the kernel it needs.
+threading.Thread(target=warm_up, name="uvsn-warm-up", daemon=True).start()
+
+
+# APEX log2 terms, memoized: batches of images share a handful of (ISO, f, t) settings.
+# Callers filter None/non-positive inputs before hitting the cache.
+@functools.lru_cache(maxsize=4096)
+def _apex_sv(iso_speed_ratings: int) -> float:
+    return math.log2(iso_speed_ratings / 3.3333)
+
+
+@functools.lru_cache(maxsize=4096)
+def _apex_av(f_number: float) -> float:
+    return 2 * math.log2(f_number)
+
+
+@functools.lru_cache(maxsize=4096)
+def _apex_tv(exposure_time: float) -> float:
+    return -math.log2(exposure_time)
+
+
+def _log2_positive(values) -> np.ndarray:
+    """Elementwise log2 of a float64 array; NaN where the input is missing (None/NaN) or <= 0."""
+    x = np.asarray(values, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    return np.log2(x, out=out, where=x > 0)
+
 
 class PhotograpicCalculations:
     """Replicate the Flutter PhotographicCalculations class"""
@@ -173,7 +192,7 @@ class PhotograpicCalculations:
             parts = name_without_ext.split('_')
 
             if not parts or not parts[0]:
-                print(f"Filename empty or invalid for lamp parsing: {filename}")
+                logger.warning("Filename empty or invalid for lamp parsing: %s", filename)
                 return None
 
             # Format: lamptype_numberofimage -> first part is lamp, second is image number
@@ -191,37 +210,37 @@ class PhotograpicCalculations:
 
             # Normalize to match dropdown display names where applicable
             lamp_code = PhotograpicCalculations._normalize_lamp_for_dropdown(lamp_code)
-            print(f"Parsed lamp code from filename: '{lamp_code}'")
+            logger.debug("Parsed lamp code from filename: '%s'", lamp_code)
             return lamp_code
         except Exception as e:
-            print(f"Error parsing lamp from filename: {e}")
+            logger.warning("Error parsing lamp from filename: %s", e)
             return None
 
+    # Parsed filename codes (lower-case) -> the 11 dropdown display names
+    LAMP_NORMALIZATIONS = {
+        '222lumen': '222Lumen',
+        '222nukit': '222Nukit',
+        '222ushio': '222Ushio',
+        '222u': '222unfiltered',
+        '222unfiltered': '222unfiltered',
+        '254': '254',
+        '265led': '265LED',
+        '280led': '280LED',
+        '295led': '295LED',
+        '365': '365',
+        'krbr': 'KrBr',
+        '207krbr': 'KrBr',
+        'room': 'room',
+        'roomlight': 'room',
+        'fluorescent': 'room',
+    }
+
     @staticmethod
     def _normalize_lamp_for_dropdown(lamp_code: str) -> str:
         """Map parsed filename codes to the 11 dropdown display names."""
         if not lamp_code:
             return lamp_code
-        lower = lamp_code.lower().strip()
-        # Map common filename codes to LAMP_CONDITIONS (11 types)
-        normalizations = {
-            '222lumen': '222Lumen',
-            '222nukit': '222Nukit',
-            '222ushio': '222Ushio',
-            '222u': '222unfiltered',
-            '222unfiltered': '222unfiltered',
-            '254': '254',
-            '265led': '265LED',
-            '280led': '280LED',
-            '295led': '295LED',
-            '365': '365',
-            'krbr': 'KrBr',
-            '207krbr': 'KrBr',
-            'room': 'room',
-            'roomlight': 'room',
-            'fluorescent': 'room',
-        }
-        return normalizations.get(lower, lamp_code)
+        return PhotograpicCalculations.LAMP_NORMALIZATIONS.get(lamp_code.lower().strip(), lamp_code)
 
     # Minimum sum of mean R + mean G + mean B for accept (reject if below).
     MIN_SUM_RGB = 100.0
@@ -244,21 +263,21 @@ class PhotograpicCalculations:
         """Calculate S_v = log2(ISOSpeedRatings/3.3333)"""
         if iso_speed_ratings is None or iso_speed_ratings <= 0:
             return None
-        return math.log2(iso_speed_ratings / 3.3333)
+        return _apex_sv(iso_speed_ratings)
     
     @staticmethod
     def calculate_av(f_number: Optional[float]) -> Optional[float]:
         """Calculate A_v = 2 * log2(FNumber)"""
         if f_number is None or f_number <= 0:
             return None
-        return 2 * math.log2(f_number)
+        return _apex_av(f_number)
     
     @staticmethod
     def calculate_tv(exposure_time: Optional[float]) -> Optional[float]:
         """Calculate T_v = -log2(ExposureTime)"""
         if exposure_time is None or exposure_time <= 0:
             return None
-        return -math.log2(exposure_time)
+        return _apex_tv(exposure_time)
     
     @staticmethod
     def calculate_bv(av: Optional[float], tv: Optional[float], sv: Optional[float]) -> Optional[float]:
@@ -267,110 +286,360 @@ class PhotograpicCalculations:
             return None
         return av + tv - sv
 
+    @staticmethod
+    def calculate_apex_batch(iso_speed_ratings, f_numbers, exposure_times) -> Dict[str, np.ndarray]:
+        """
+        calculate_sv/av/tv/bv for many images at once (one array entry per
+        image), one np.log2 pass per term. Missing or non-positive inputs give
+        NaN instead of None, and bV is NaN wherever any of its terms is.
+        Returns arrays under extract_photographic_values' keys.
+        """
+        iso = np.asarray(iso_speed_ratings, dtype=np.float64)
+        sv = _log2_positive(iso / 3.3333)
+        av = 2 * _log2_positive(f_numbers)
+        tv = -_log2_positive(exposure_times)
+        return {'sV': sv, 'aV': av, 'tV': tv, 'bV': av + tv - sv}
+
+
+# RAW formats decoded from sensor data (lower-case extension, no dot)
+RAW_EXTENSIONS = frozenset({'dng', 'raw', 'cr2', 'nef', 'arw', 'rw2', 'orf', 'pef'})
+
+
+def _file_extension(filename: str) -> str:
+    """Lower-case extension without the dot ('' if there is none)."""
+    _, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot else ''
+
+
+_FILE_SIZE_UNITS = ('B', 'KB', 'MB', 'GB')
+
+
+def _format_file_size(size: int) -> str:
+    """'512 B', '1.5 KB', ... up to GB; the unit comes from the bit length (1024 = 2**10)."""
+    unit = min(len(_FILE_SIZE_UNITS) - 1, max(0, (size.bit_length() - 1) // 10))
+    if unit == 0:
+        return f"{size} B"
+    return f"{size / (1 << (10 * unit)):.1f} {_FILE_SIZE_UNITS[unit]}"
+
+
+@functools.lru_cache(maxsize=None)
+def _srgb_linear_lut(bits: int) -> np.ndarray:
+    """Linear (0-1) value of every bits-wide sRGB code, for fused_stats(arr, lut)."""
+    codes = np.arange(1 << bits, dtype=np.float64)
+    return ImageAnalyzer._srgb_to_linear(codes / codes[-1])
+
+
+def _spooled_file_path(stream: BinaryIO) -> Optional[str]:
+    """/proc/self/fd path of a stream already backed by a real file, else None."""
+    if getattr(stream, '_rolled', True) is False:  # SpooledTemporaryFile still in memory
+        return None
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+    path = f"/proc/self/fd/{fd}"
+    if not os.path.exists(path):
+        return None
+    stream.flush()
+    return path
+
+
+@contextlib.contextmanager
+def _raw_upload_path(stream: Union[str, BinaryIO]):
+    """
+    Yield a filesystem path holding the uploaded RAW file, for rawpy.imread.
+    Given a file object rawpy reads the whole file into one in-memory buffer;
+    given a path LibRaw reads from disk. A path is yielded as-is.
+
+    Uploads over 1 MB are already spooled to an (unlinked) temporary file;
+    on Linux LibRaw can open that one through /proc/self/fd, so no copy is
+    made. Otherwise the upload is copied to a temporary file in 1 MB chunks
+    and removed afterwards.
+    """
+    if isinstance(stream, str):
+        yield stream
+        return
+    fd_path = _spooled_file_path(stream)
+    if fd_path is not None:
+        yield fd_path
+        return
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.raw') as tmp:
+        shutil.copyfileobj(stream, tmp, 1 << 20)
+        tmp.flush()
+        yield tmp.name
+
+
+# Pillow EXIF IFDs and the exifread key prefix for their tags.
+# The Flutter client and extract_photographic_values expect 'EXIF FNumber', 'Image Make', ...
+_EXIF_IFDS = (
+    (None, 'Image'),
+    (ExifTags.IFD.Exif, 'EXIF'),
+    (ExifTags.IFD.GPSInfo, 'GPS'),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _exifread_tables() -> Tuple[Dict[str, Dict[int, tuple]], frozenset]:
+    """
+    exifread's tag tables ({tag: (name, [printer])}) per _EXIF_IFDS prefix,
+    and the tags it skips with details=False (MakerNote, UserComment, ...),
+    so Pillow-parsed EXIF gets the same keys exifread returns for RAW files.
+    """
+    from exifread.tags import EXIF_TAGS, IGNORE_TAGS  # the tag tables only, not the parser
+    from exifread.tags.exif import GPS_TAGS
+    return {'Image': EXIF_TAGS, 'EXIF': EXIF_TAGS, 'GPS': GPS_TAGS}, frozenset(IGNORE_TAGS)
+
+
+def _exif_value_to_str(value) -> str:
+    """
+    Format an EXIF value the way exifread prints it (rationals as 'num/den',
+    UNDEFINED bytes as text). exifread tags already print that way via str().
+    """
+    if isinstance(value, IFDRational):
+        if value.denominator == 0:
+            return str(value)
+        return str(Fraction(value.numerator, value.denominator))
+    if isinstance(value, bytes):
+        return value.decode('ascii', 'replace').strip(' \x00')
+    if isinstance(value, tuple):
+        return '[' + ', '.join(_exif_value_to_str(v) for v in value) + ']'
+    return str(value)
+
+
+@functools.lru_cache(maxsize=None)
+def _exifread_printers() -> Dict[str, Any]:
+    """
+    exifread's printable mapping (value lookup dict or formatting function)
+    per tag name, e.g. 'Flash' -> {0: 'Flash did not fire', ...}.
+    Image and EXIF IFD tags share one table; GPS tags have no mappings.
+    """
+    tables, _ = _exifread_tables()
+    return {entry[0]: entry[1] for entry in tables['EXIF'].values()
+            if len(entry) > 1 and (callable(entry[1]) or isinstance(entry[1], dict))}
+
+
+def _exif_printable(key: str, value) -> str:
+    """
+    Response string for one EXIF value, as exifread would print it:
+    enumerations (Flash, MeteringMode, ExposureProgram, ...) and version
+    strings go through exifread's own tables, everything else through
+    _exif_value_to_str. exifread tags (RAW uploads) print themselves.
+    """
+    prefix, _, name = key.partition(' ')
+    printer = _exifread_printers().get(name) if prefix in ('Image', 'EXIF') else None
+    if printer is None or hasattr(value, 'printable'):
+        return _exif_value_to_str(value)
+    values = list(value) if isinstance(value, (bytes, tuple)) else [value]
+    if callable(printer):
+        return printer(values)
+    return ''.join(printer.get(v, repr(v)) for v in values)
+
+
+def _exif_to_json(exif_data: Dict[str, Any]) -> Dict[str, str]:
+    """EXIF values as the printable strings the response (and the client's EXIF list) shows."""
+    return {tag: _exif_printable(tag, value) for tag, value in exif_data.items()}
+
+
+def _parse_rational(value) -> float:
+    """
+    Convert an EXIF number to float without a string round-trip where possible:
+    Pillow IFDRational/int, exifread tags (first Ratio/int of .values) and
+    'num/den' strings. Raises ValueError for non-finite values (e.g. x/0).
+    """
+    if hasattr(value, 'values'):  # exifread IfdTag
+        value = value.values
+    if isinstance(value, (list, tuple)):
+        value = value[0]
+    if isinstance(value, str):
+        num, sep, den = value.partition('/')
+        result = float(num) / float(den) if sep else float(num)
+    else:
+        result = float(value)
+    if not math.isfinite(result):
+        raise ValueError(f"Non-finite EXIF value: {value!r}")
+    return result
+
+
+# Errors _parse_rational can raise on malformed EXIF values
+_EXIF_PARSE_ERRORS = (ValueError, TypeError, ZeroDivisionError, IndexError)
+
+# EXIF keys checked (first hit wins) for each photographic value
+_ISO_KEYS = ('EXIF ISOSpeedRatings', 'ISOSpeedRatings', 'ISO')
+_FNUMBER_KEYS = ('EXIF FNumber', 'FNumber', 'F-Number')
+_EXPOSURE_TIME_KEYS = ('EXIF ExposureTime', 'ExposureTime')
+
+
+def _exif_number(exif_data: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[float]:
+    """Parse the first of keys present in exif_data; None if missing or malformed."""
+    raw = next((exif_data[k] for k in keys if k in exif_data), None)
+    if raw is None:
+        return None
+    try:
+        return _parse_rational(raw)
+    except _EXIF_PARSE_ERRORS:
+        return None
+
 
 class ImageAnalyzer:
     """Replicate the Flutter UnifiedImageService chromaticity logic"""
     
+    # Approximate RAW statistics demosaic roughly this many pixels (whole strips)
+    RAW_SAMPLE_PIXELS = 4_000_000
+
     @staticmethod
-    def matlab_compatible_streaming_analysis(file_bytes: bytes) -> Dict[str, Any]:
+    def matlab_compatible_streaming_analysis(stream: Union[str, BinaryIO], exact: bool = False,
+                                             binned: bool = False) -> Dict[str, Any]:
         """
         MATLAB-compatible RAW analysis with STREAMING to minimize memory.
         
         Instead of creating the full RGB array, we:
-        1. Keep CFA as int32 (not float64) 
-        2. Demosaic in strips (100 rows at a time)
+        1. Keep CFA in its native uint16 (not float64), black level removed in place
+        2. Demosaic in strips (100 rows at a time, float32)
         3. Calculate statistics on-the-fly
         
         Returns statistics directly, never materializing full RGB.
+        stream is the uploaded file object (read from the start) or a path to it.
+
+        Unless exact=True, sensors larger than RAW_SAMPLE_PIXELS only demosaic
+        8-row strips evenly spaced over the frame (~RAW_SAMPLE_PIXELS in
+        total); as with the non-RAW sampling, means/stds stay close to the
+        full-frame values while maxima can come out slightly lower.
+
+        binned=True skips the demosaic: every 2x2 Bayer quad becomes one RGB
+        sample (see _quad_stats). Much cheaper; means stay close to the
+        demosaiced ones, but chromaticity stds and maxima differ (noise is
+        averaged over the two green sites), so it is not MATLAB-compatible.
         """
-        with rawpy.imread(io.BytesIO(file_bytes)) as raw:
-            # Get raw CFA data as int32 (saves memory vs float64)
-            cfa_full = raw.raw_image_visible.astype(np.int32)
+        import rawpy  # LibRaw is heavy; only load it for RAW uploads
+        with _raw_upload_path(stream) as raw_path, rawpy.imread(raw_path) as raw:
+            # Raw CFA, black-level corrected in place below in its native dtype
+            # (uint16: a quarter of float64). It is a view into LibRaw's
+            # buffer, only valid inside this block, which covers every use.
+            cfa_full = raw.raw_image_visible
+            if not cfa_full.flags.writeable:
+                cfa_full = cfa_full.copy()
             height, width = cfa_full.shape
-            print(f"Raw CFA: {width}x{height}, dtype: int32")
+            logger.debug("Raw CFA: %dx%d, dtype: %s", width, height, cfa_full.dtype)
             
             # Get black levels and pattern
-            black_levels = np.array(raw.black_level_per_channel, dtype=np.int32)
+            black_levels = np.array(raw.black_level_per_channel)
             pattern = raw.raw_pattern
-            print(f"Black levels: {black_levels}, Pattern:\n{pattern}")
+            logger.debug("Black levels: %s, Pattern:\n%s", black_levels, pattern)
             
             # Find pattern positions
             r_pos = tuple(np.argwhere(pattern == 0)[0])
             b_pos = tuple(np.argwhere(pattern == 2)[0])
             
-            # Apply black level correction in-place
+            # Black level correction clamped to 0 without leaving the unsigned
+            # dtype: max(x, black) - black == max(x - black, 0). Each row parity
+            # is handled in one contiguous pass against a full-width line of its
+            # two black levels.
+            black_tile = black_levels[pattern].astype(cfa_full.dtype)
             for i in range(2):
-                for j in range(2):
-                    channel = pattern[i, j]
-                    cfa_full[i::2, j::2] -= black_levels[channel]
-            
-            # Clamp to 0
-            cfa_full = np.maximum(0, cfa_full)
-            print(f"After black level: {cfa_full.min()} - {cfa_full.max()}")
-            
-            # Statistics accumulators
-            sum_r, sum_g, sum_b = 0.0, 0.0, 0.0
-            sum_r_chrom, sum_g_chrom = 0.0, 0.0
-            sum_r_chrom_sq, sum_g_chrom_sq = 0.0, 0.0
-            max_r, max_g, max_b = 0.0, 0.0, 0.0
-            n_pixels = 0
-            n_chrom = 0
+                black_line = np.resize(black_tile[i], width)
+                rows = cfa_full[i::2]
+                np.maximum(rows, black_line, out=rows)
+                rows -= black_line
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("After black level: %s - %s", cfa_full.min(), cfa_full.max())
             
             # Process in strips (100 rows at a time with 2-row overlap for demosaic)
             strip_height = 100
-            
-            for strip_start in range(0, height, strip_height):
+            strip_stride = strip_height
+            if not exact:
+                step = max(1, round(height * width / ImageAnalyzer.RAW_SAMPLE_PIXELS))
+                if step > 1:
+                    # Many short strips rather than a few 100-row ones, so the
+                    # sample is spread finely over the frame (no aliasing with
+                    # large-scale structure); 8 rows keeps the Bayer phase
+                    strip_height = 8
+                    strip_stride = strip_height * step
+                    logger.debug("Approximate stats: demosaicing %d of every %d rows", strip_height, strip_stride)
+            strips = []
+            for strip_start in range(0, height, strip_stride):
                 # Get strip with padding for demosaic (need 1 row above and below)
                 pad_top = 1 if strip_start > 0 else 0
                 pad_bottom = 1 if strip_start + strip_height < height else 0
-                
                 actual_start = strip_start - pad_top
                 actual_end = min(strip_start + strip_height + pad_bottom, height)
+                strips.append((actual_start, actual_end, pad_top, pad_bottom))
+            
+            if binned:
+                (channel_sum, channel_max, chrom_sum, chrom_sq_sum,
+                 n_chrom, n_pixels) = ImageAnalyzer._quad_stats(cfa_full, pattern)
+                sum_r, sum_g, sum_b = channel_sum.tolist()
+                max_r, max_g, max_b = channel_max.tolist()
+                sum_r_chrom, sum_g_chrom = chrom_sum.tolist()
+                sum_r_chrom_sq, sum_g_chrom_sq = chrom_sq_sum.tolist()
+            elif HAVE_DEMOSAIC_STATS_KERNEL and cfa_full.dtype == np.uint16:
+                # One fused kernel demosaics the strips' rows and reduces them
+                # on the fly: no RGB strips at all
+                rows, rows_up, rows_down = ImageAnalyzer._strip_rows(strips, height)
+                channel_sum, channel_max, moments, n_chrom = demosaic_stats(cfa_full, pattern, r_pos, b_pos,
+                                                                            rows, rows_up, rows_down)
+                sum_r, sum_g, sum_b = channel_sum.tolist()
+                max_r, max_g, max_b = channel_max.tolist()
+                sum_r_chrom, sum_r_chrom_sq, sum_g_chrom, sum_g_chrom_sq = moments
+                n_pixels = rows.size * width
+            else:
+                sum_r, sum_g, sum_b = 0.0, 0.0, 0.0
+                sum_r_chrom, sum_g_chrom = 0.0, 0.0
+                sum_r_chrom_sq, sum_g_chrom_sq = 0.0, 0.0
+                max_r, max_g, max_b = 0.0, 0.0, 0.0
+                n_pixels = 0
+                n_chrom = 0
+                # Two sets of R, G, B planes (padding rows included): the
+                # executor demosaics strip N+1 into one while strip N is
+                # reduced out of the other. NumPy drops the GIL for
+                # both, so the two overlap on separate cores.
+                rgb_buffers = np.empty((2, 3, strip_height + 2, width), dtype=np.float32)
+
+                def demosaic(index):
+                    # CRITICAL: pass actual_start so demosaic knows the pattern offset!
+                    actual_start, actual_end = strips[index][:2]
+                    return ImageAnalyzer.demosaic_strip(cfa_full[actual_start:actual_end, :], pattern, r_pos, b_pos,
+                                                        actual_start, planar=True,
+                                                        out=rgb_buffers[index % 2][:, :actual_end - actual_start])
+
+                # A worker of this call's own (concurrent requests must not queue
+                # behind each other's strips). Leaving the with block waits for it,
+                # so it never reads cfa_full after LibRaw has freed it.
+                with ThreadPoolExecutor(max_workers=1, thread_name_prefix="uvsn-strip") as executor:
+                    pending = executor.submit(demosaic, 0)
+                    for index, (actual_start, actual_end, pad_top, pad_bottom) in enumerate(strips):
+                        rgb_strip = pending.result()
+                        if index + 1 < len(strips):
+                            pending = executor.submit(demosaic, index + 1)
                 
-                # Extract and demosaic this strip
-                # CRITICAL: pass actual_start so demosaic knows the pattern offset!
-                cfa_strip = cfa_full[actual_start:actual_end, :].astype(np.float32)
-                rgb_strip = ImageAnalyzer.demosaic_strip(cfa_strip, pattern, r_pos, b_pos, actual_start)
-                
-                # Remove padding rows from result
-                if pad_top:
-                    rgb_strip = rgb_strip[1:, :, :]
-                if pad_bottom and actual_end < height:
-                    rgb_strip = rgb_strip[:-1, :, :]
-                
-                # Accumulate statistics from this strip
-                r = rgb_strip[:, :, 0]
-                g = rgb_strip[:, :, 1]
-                b = rgb_strip[:, :, 2]
+                        # Remove padding rows from result
+                        if pad_top:
+                            rgb_strip = rgb_strip[:, 1:, :]
+                        if pad_bottom and actual_end < height:
+                            rgb_strip = rgb_strip[:, :-1, :]
                 
-                # RGB sums and max
-                sum_r += np.sum(r)
-                sum_g += np.sum(g)
-                sum_b += np.sum(b)
-                max_r = max(max_r, np.max(r))
-                max_g = max(max_g, np.max(g))
-                max_b = max(max_b, np.max(b))
-                n_pixels += r.size
+                        # Accumulate statistics from this strip (contiguous rows of each plane)
+                        r, g, b = rgb_strip
                 
-                # Chromaticity
-                rgb_sum = r + g + b
-                valid = rgb_sum > 0
-                if np.any(valid):
-                    r_chrom = r[valid] / rgb_sum[valid]
-                    g_chrom = g[valid] / rgb_sum[valid]
-                    sum_r_chrom += np.sum(r_chrom)
-                    sum_g_chrom += np.sum(g_chrom)
-                    sum_r_chrom_sq += np.sum(r_chrom * r_chrom)
-                    sum_g_chrom_sq += np.sum(g_chrom * g_chrom)
-                    n_chrom += np.sum(valid)
+                        # RGB sums and max
+                        sum_r += np.sum(r)
+                        sum_g += np.sum(g)
+                        sum_b += np.sum(b)
+                        max_r = max(max_r, np.max(r))
+                        max_g = max(max_g, np.max(g))
+                        max_b = max(max_b, np.max(b))
+                        n_pixels += r.size
                 
-                # Free strip memory
-                del cfa_strip, rgb_strip, r, g, b, rgb_sum
-                gc.collect()
+                        # Chromaticity
+                        chrom_sum, chrom_sq_sum, n_valid = ImageAnalyzer._chromaticity_sums(rgb_strip.reshape(3, -1))
+                        sum_r_chrom += chrom_sum[0]
+                        sum_g_chrom += chrom_sum[1]
+                        sum_r_chrom_sq += chrom_sq_sum[0]
+                        sum_g_chrom_sq += chrom_sq_sum[1]
+                        n_chrom += n_valid
             
             # Free CFA memory
             del cfa_full
-            gc.collect()
             
             # Calculate final statistics
             mean_r = sum_r / n_pixels
@@ -387,9 +656,9 @@ class ImageAnalyzer:
             else:
                 mean_r_chrom = mean_g_chrom = std_r_chrom = std_g_chrom = 0.0
             
-            print(f"✅ Streaming analysis complete: {n_pixels} pixels")
-            print(f"Mean RGB: {mean_r:.2f}, {mean_g:.2f}, {mean_b:.2f}")
-            print(f"Chromaticity: r={mean_r_chrom:.6f}, g={mean_g_chrom:.6f}")
+            logger.debug("✅ Streaming analysis complete: %d pixels", n_pixels)
+            logger.debug("Mean RGB: %.2f, %.2f, %.2f", mean_r, mean_g, mean_b)
+            logger.debug("Chromaticity: r=%.6f, g=%.6f", mean_r_chrom, mean_g_chrom)
             
             return {
                 'width': int(width),
@@ -407,116 +676,231 @@ class ImageAnalyzer:
             }
     
     @staticmethod
-    def demosaic_strip(cfa: np.ndarray, pattern: np.ndarray, r_pos: tuple, b_pos: tuple, row_offset: int = 0) -> np.ndarray:
+    def _strip_rows(strips: list, height: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (rows, rows_up, rows_down) for _kernels.demosaic_stats: every row the
+        strip loop keeps from strips, with the rows demosaic_strip interpolates
+        it from. Those wrap around each strip, not the frame, so both paths
+        give the same statistics.
+        """
+        rows, rows_up, rows_down = [], [], []
+        for actual_start, actual_end, pad_top, pad_bottom in strips:
+            strip = np.arange(actual_start, actual_end)
+            keep = slice(pad_top, strip.size - (1 if pad_bottom and actual_end < height else 0))
+            rows.append(strip[keep])
+            rows_up.append(np.roll(strip, 1)[keep])
+            rows_down.append(np.roll(strip, -1)[keep])
+        return np.concatenate(rows), np.concatenate(rows_up), np.concatenate(rows_down)
+    
+    @staticmethod
+    def _quad_stats(cfa: np.ndarray, pattern: np.ndarray):
+        """
+        Statistics with one RGB sample per 2x2 Bayer quad, no demosaic:
+        R and B are the quad's red and blue sites, G the mean of its two
+        green sites. Quads are gathered in bands of ~STATS_BLOCK_PIXELS.
+        Returns (channel_sum, channel_max, chrom_sum, chrom_sq_sum, n_chrom, n_quads).
+        """
+        sites = {0: [], 1: [], 2: []}
+        for i in range(2):
+            for j in range(2):
+                channel = 1 if pattern[i, j] == 3 else int(pattern[i, j])
+                sites[channel].append((i, j))
+        quad_rows, quad_cols = cfa.shape[0] // 2, cfa.shape[1] // 2
+
+        def plane(i, j):
+            return cfa[i::2, j::2][:quad_rows, :quad_cols]
+
+        (ri, rj), = sites[0]
+        (bi, bj), = sites[2]
+        (g1i, g1j), (g2i, g2j) = sites[1]
+        red, green1, green2, blue = plane(ri, rj), plane(g1i, g1j), plane(g2i, g2j), plane(bi, bj)
+
+        channel_sum = np.zeros(3)
+        channel_max = np.zeros(3)
+        chrom_sum = np.zeros(2)
+        chrom_sq_sum = np.zeros(2)
+        n_chrom = 0
+        rows = max(1, ImageAnalyzer.STATS_BLOCK_PIXELS // max(1, quad_cols))
+        planes = np.empty((3, rows, quad_cols), dtype=np.float32)
+        for y0 in range(0, quad_rows, rows):
+            y1 = min(y0 + rows, quad_rows)
+            band = planes[:, :y1 - y0]
+            band[0] = red[y0:y1]
+            np.add(green1[y0:y1], green2[y0:y1], out=band[1], dtype=np.float32)
+            band[1] *= 0.5
+            band[2] = blue[y0:y1]
+            channels = band.reshape(3, -1)
+            band_sum, band_max = ImageAnalyzer._channel_totals(channels, np.float64)
+            channel_sum += band_sum
+            np.maximum(channel_max, band_max, out=channel_max)
+            band_chrom, band_chrom_sq, n_valid = ImageAnalyzer._chromaticity_sums(channels)
+            chrom_sum += band_chrom
+            chrom_sq_sum += band_chrom_sq
+            n_chrom += n_valid
+        return channel_sum, channel_max, chrom_sum, chrom_sq_sum, n_chrom, quad_rows * quad_cols
+
+    @staticmethod
+    def _channel_totals(channels: np.ndarray, dtype) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per-channel sums (accumulated in dtype) and maxima of a (3, N)
+        channel-major block: planes, or pixels.T for interleaved (N, 3) data.
+        Each channel is reduced as its own 1-D view: an axis=0 reduction over
+        3-wide rows runs about 10x slower.
+        """
+        sums = np.array([np.add.reduce(channel, dtype=dtype) for channel in channels])
+        maxima = np.array([channel.max() for channel in channels])
+        return sums, maxima
+
+    @staticmethod
+    def _chromaticity_sums(rgb: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Chromaticity moments of a (3, N) channel-major float block (see
+        _channel_totals), unit stride when the channels are separate planes.
+        Returns (sum of (r, g) chromaticity, sum of their squares, valid pixel count).
+
+        Chromaticity (MATLAB style): r = R/(R+G+B), g = G/(R+G+B); only
+        R+G+B = 0 is excluded. Values are non-negative, so such a pixel has
+        R = G = 0: dividing it by a tiny positive "safe" sum gives exactly 0
+        and it drops out of the sums without a mask or a masked divide. einsum
+        forms the sum of squares without a squared temporary.
+        """
+        rgb_sum = rgb[0] + rgb[1]
+        rgb_sum += rgb[2]
+        n_valid = int(np.count_nonzero(rgb_sum))
+        np.maximum(rgb_sum, np.finfo(rgb_sum.dtype).tiny, out=rgb_sum)
+        sums = np.empty(2)
+        sq_sums = np.empty(2)
+        chrom = np.empty_like(rgb_sum)
+        for channel in (0, 1):
+            np.divide(rgb[channel], rgb_sum, out=chrom)
+            sums[channel] = np.add.reduce(chrom, dtype=np.float64)
+            sq_sums[channel] = np.einsum('i,i->', chrom, chrom, dtype=np.float64)
+        return sums, sq_sums, n_valid
+
+    @staticmethod
+    def _neighbor_mean(x: np.ndarray, axis: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Mean of the two neighbours along axis (a [1, 0, 1] / 2 filter), with
+        the same wrap-around edges as np.roll. Uses slice views and a single
+        output buffer instead of two rolled copies; pass out (same shape and
+        dtype as x, not x itself) to reuse a scratch buffer.
+        """
+        if out is None:
+            out = np.empty_like(x)
+        if x.shape[axis] < 2:
+            out[...] = x
+            return out
+        a = np.moveaxis(x, axis, 0)
+        o = np.moveaxis(out, axis, 0)
+        np.add(a[:-2], a[2:], out=o[1:-1])
+        np.add(a[-1], a[1], out=o[0])
+        np.add(a[-2], a[0], out=o[-1])
+        o *= 0.5
+        return out
+
+    @staticmethod
+    def demosaic_strip(cfa: np.ndarray, pattern: np.ndarray, r_pos: tuple, b_pos: tuple, row_offset: int = 0,
+                       out: Optional[np.ndarray] = None, planar: bool = False) -> np.ndarray:
         """
         Demosaic a strip of CFA data using bilinear interpolation.
-        Input: float32 CFA strip, Output: float32 RGB strip
+        Input: uint16 or float32 CFA strip, Output: float32 RGB strip
         
         row_offset: the starting row in the original image (for correct pattern alignment)
+        planar: return separate R, G, B planes, shape (3, H, W), instead of (H, W, 3)
+        out: optional float32 buffer of the result's shape to write to
         """
+        cfa = cfa.astype(np.float32, copy=False)
         height, width = cfa.shape
-        rgb = np.zeros((height, width, 3), dtype=np.float32)
-        
-        # Create masks for this strip with correct pattern alignment
-        # The pattern repeats every 2 rows, so we need to account for where this strip starts
-        r_mask = np.zeros((height, width), dtype=bool)
-        g_mask = np.zeros((height, width), dtype=bool)
-        b_mask = np.zeros((height, width), dtype=bool)
+        # One contiguous plane per channel (interpolation reads/writes unit
+        # stride); interleaved to (H, W, 3) once at the end unless planar
+        if planar and out is not None:
+            planes = out
+            planes[...] = 0
+        else:
+            planes = np.zeros((3, height, width), dtype=np.float32)
         
-        # Adjust pattern indices based on row_offset
-        row_phase = row_offset % 2  # 0 or 1
-        
-        for i in range(2):
-            for j in range(2):
-                channel = pattern[i, j]
-                # Adjust row start based on offset: if row_offset is odd, shift pattern by 1
-                adjusted_i = (i + row_phase) % 2
-                if channel == 0:
-                    r_mask[adjusted_i::2, j::2] = True
-                elif channel == 1 or channel == 3:
-                    g_mask[adjusted_i::2, j::2] = True
-                elif channel == 2:
-                    b_mask[adjusted_i::2, j::2] = True
+        # Channel of each 2x2 site for this strip with correct pattern alignment
+        # (0 = R, 1 = G, 2 = B). The pattern repeats every 2 rows, so if
+        # row_offset is odd the strip's first row is pattern row 1.
+        # Every site is addressed with ::2 strides; no full-size masks.
+        tile = pattern[[row_offset % 2, (row_offset + 1) % 2]]
+        sites = [(i, j, 1 if tile[i, j] == 3 else int(tile[i, j])) for i in range(2) for j in range(2)]
         
         # Place known values
-        rgb[:, :, 0] = np.where(r_mask, cfa, 0)
-        rgb[:, :, 1] = np.where(g_mask, cfa, 0)
-        rgb[:, :, 2] = np.where(b_mask, cfa, 0)
-        
-        # Simple bilinear interpolation using shifts (memory efficient)
-        # For Red at non-red positions
-        r_ch = rgb[:, :, 0]
-        r_h = (np.roll(r_ch, 1, axis=1) + np.roll(r_ch, -1, axis=1)) / 2
-        r_v = (np.roll(r_ch, 1, axis=0) + np.roll(r_ch, -1, axis=0)) / 2
-        r_d = (np.roll(np.roll(r_ch, 1, axis=0), 1, axis=1) + 
-               np.roll(np.roll(r_ch, 1, axis=0), -1, axis=1) +
-               np.roll(np.roll(r_ch, -1, axis=0), 1, axis=1) + 
-               np.roll(np.roll(r_ch, -1, axis=0), -1, axis=1)) / 4
-        
-        row_idx = np.arange(height)[:, np.newaxis] % 2
-        # Adjust r_pos and b_pos for the row offset
-        adjusted_r_row = (r_pos[0] + row_offset) % 2
-        same_row_r = (row_idx == adjusted_r_row)
+        for i, j, channel in sites:
+            if channel in (0, 1, 2):
+                planes[channel, i::2, j::2] = cfa[i::2, j::2]
         
-        need_r = ~r_mask
-        rgb[:, :, 0] = np.where(need_r & b_mask, r_d, rgb[:, :, 0])
-        rgb[:, :, 0] = np.where(need_r & ~b_mask & same_row_r, r_h, rgb[:, :, 0])
-        rgb[:, :, 0] = np.where(need_r & ~b_mask & ~same_row_r, r_v, rgb[:, :, 0])
-        del r_ch, r_h, r_v, r_d
-        
-        # For Blue at non-blue positions
-        b_ch = rgb[:, :, 2]
-        b_h = (np.roll(b_ch, 1, axis=1) + np.roll(b_ch, -1, axis=1)) / 2
-        b_v = (np.roll(b_ch, 1, axis=0) + np.roll(b_ch, -1, axis=0)) / 2
-        b_d = (np.roll(np.roll(b_ch, 1, axis=0), 1, axis=1) + 
-               np.roll(np.roll(b_ch, 1, axis=0), -1, axis=1) +
-               np.roll(np.roll(b_ch, -1, axis=0), 1, axis=1) + 
-               np.roll(np.roll(b_ch, -1, axis=0), -1, axis=1)) / 4
-        
-        adjusted_b_row = (b_pos[0] + row_offset) % 2
-        same_row_b = (row_idx == adjusted_b_row)
-        need_b = ~b_mask
-        rgb[:, :, 2] = np.where(need_b & r_mask, b_d, rgb[:, :, 2])
-        rgb[:, :, 2] = np.where(need_b & ~r_mask & same_row_b, b_h, rgb[:, :, 2])
-        rgb[:, :, 2] = np.where(need_b & ~r_mask & ~same_row_b, b_v, rgb[:, :, 2])
-        del b_ch, b_h, b_v, b_d
+        # Simple bilinear interpolation. The 3x3 kernels are separable:
+        # diagonal = vertical mean of the horizontal mean, cross = mean of both
+        # Red at non-red sites, then blue at non-blue sites: the diagonal mean at
+        # the opposite colour, else the horizontal mean on rows that contain the
+        # colour and the vertical mean on the others.
+        # The three interpolated planes are scratch buffers shared by all channels.
+        interp_h, interp_v, interp_d = np.empty((3, height, width), dtype=np.float32)
+        for channel, other, pos in ((0, 2, r_pos), (2, 0, b_pos)):
+            plane = planes[channel]
+            ImageAnalyzer._neighbor_mean(plane, axis=1, out=interp_h)
+            ImageAnalyzer._neighbor_mean(plane, axis=0, out=interp_v)
+            ImageAnalyzer._neighbor_mean(interp_h, axis=0, out=interp_d)
+            same_row = (pos[0] + row_offset) % 2
+            for i, j, site in sites:
+                if site == channel:
+                    continue
+                if site == other:
+                    source = interp_d
+                elif i == same_row:
+                    source = interp_h
+                else:
+                    source = interp_v
+                plane[i::2, j::2] = source[i::2, j::2]
+            del plane
         
         # For Green at red/blue positions
-        g_ch = rgb[:, :, 1]
-        g_cross = (np.roll(g_ch, 1, axis=0) + np.roll(g_ch, -1, axis=0) +
-                   np.roll(g_ch, 1, axis=1) + np.roll(g_ch, -1, axis=1)) / 4
-        rgb[:, :, 1] = np.where(~g_mask, g_cross, rgb[:, :, 1])
-        del g_ch, g_cross
+        g_ch = planes[1]
+        g_cross = ImageAnalyzer._neighbor_mean(g_ch, axis=0, out=interp_v)
+        g_cross += ImageAnalyzer._neighbor_mean(g_ch, axis=1, out=interp_h)
+        g_cross *= 0.5
+        for i, j, site in sites:
+            if site != 1:
+                g_ch[i::2, j::2] = g_cross[i::2, j::2]
+        del g_ch, g_cross, source, interp_h, interp_v, interp_d
         
-        return rgb
+        if planar:
+            return planes
+        return np.stack(planes, axis=2, out=out)
     
     @staticmethod
-    def decode_image(file_bytes: bytes, filename: str) -> Image.Image:
+    def decode_image(stream: BinaryIO, filename: str) -> Tuple[Any, Optional[Image.Exif]]:
         """
         Decode image with fallbacks for RAW formats
         Replicates _decodeImageWithFallbacks from Flutter
+        Returns (image, exif): a PIL Image and Pillow's parsed EXIF block, or for
+        RAW files the decoded (H, W, 3) ndarray (16-bit data preserved) and None
         
         IMPORTANT: RAW files (DNG, CR2, etc.) are processed FIRST with MATLAB-compatible
         decoder to get true sensor data, NOT the embedded JPEG preview!
         """
         # Check if this is a RAW file - process with MATLAB-compatible decoder FIRST
         # (PIL would read the embedded JPEG thumbnail, not the actual sensor data!)
-        raw_extensions = ('.dng', '.raw', '.cr2', '.nef', '.arw', '.rw2', '.orf', '.pef')
-        if filename.lower().endswith(raw_extensions):
+        if _file_extension(filename) in RAW_EXTENSIONS:
             try:
-                print(f"=== RAW file detected: {filename} ===")
-                print(f"=== Using MATLAB-compatible RAW decode (not JPEG preview) ===")
-                rgb = ImageAnalyzer.matlab_compatible_raw_decode(file_bytes)
-                print(f"✅ SUCCESS: MATLAB-compatible RAW decode")
-                print(f"RGB array shape: {rgb.shape}, dtype: {rgb.dtype}")
-                print(f"RGB value range: {rgb.min()} - {rgb.max()}")
-                return NumpyImageWrapper(rgb)
+                logger.debug("=== RAW file detected: %s ===", filename)
+                logger.debug("=== Using MATLAB-compatible RAW decode (not JPEG preview) ===")
+                stream.seek(0)
+                rgb = ImageAnalyzer.matlab_compatible_raw_decode(stream)
+                logger.debug("✅ SUCCESS: MATLAB-compatible RAW decode")
+                logger.debug("RGB array shape: %s, dtype: %s", rgb.shape, rgb.dtype)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("RGB value range: %s - %s", rgb.min(), rgb.max())
+                return rgb, None
             except Exception as e:
-                print(f"❌ MATLAB-compatible RAW decoder failed: {e}")
+                logger.warning("❌ MATLAB-compatible RAW decoder failed: %s", e)
                 # Fallback to rawpy postprocess (still better than JPEG preview)
                 try:
-                    print(f"=== Falling back to rawpy postprocess ===")
-                    with rawpy.imread(io.BytesIO(file_bytes)) as raw:
+                    logger.debug("=== Falling back to rawpy postprocess ===")
+                    import rawpy  # LibRaw is heavy; only load it for RAW uploads
+                    with _raw_upload_path(stream) as raw_path, rawpy.imread(raw_path) as raw:
                         rgb = raw.postprocess(
                             output_bps=16,
                             use_camera_wb=False,
@@ -526,44 +910,82 @@ class ImageAnalyzer:
                             gamma=(1, 1),
                             half_size=False,
                         )
-                        print(f"✅ SUCCESS: rawpy postprocess fallback")
-                        return NumpyImageWrapper(rgb)
+                        logger.debug("✅ SUCCESS: rawpy postprocess fallback")
+                        return rgb, None
                 except Exception as e2:
-                    print(f"❌ rawpy fallback also failed: {e2}")
+                    logger.error("❌ rawpy fallback also failed: %s", e2)
                     raise Exception(f"Failed to decode RAW file: {e}, fallback: {e2}")
         
         # For non-RAW files, use PIL (standard image formats)
         try:
-            img = Image.open(io.BytesIO(file_bytes))
-            print(f"✅ SUCCESS: PIL decoder worked for {filename}")
-            print(f"Image dimensions: {img.size}, mode: {img.mode}")
-            return img
+            stream.seek(0)
+            img = Image.open(stream)
+            img.load()
+            # EXIF was parsed along with the container, no second pass needed
+            exif = img.getexif()
+            logger.debug("✅ SUCCESS: PIL decoder worked for %s", filename)
+            logger.debug("Image dimensions: %s, mode: %s", img.size, img.mode)
+            return img, exif
         except Exception as e:
-            print(f"❌ PIL decoder failed: {e}")
+            logger.error("❌ PIL decoder failed: %s", e)
         
         raise Exception(f"Failed to decode image - format may not be supported or file may be corrupted")
 
     @staticmethod
     def _srgb_to_linear(v: np.ndarray) -> np.ndarray:
-        """Convert sRGB (0-1) to linear (0-1). Vectorized."""
-        out = np.where(v <= 0.04045, v / 12.92, np.power((v + 0.055) / 1.055, 2.4))
-        return out.astype(np.float64)
+        """Convert sRGB (0-1) to linear (0-1). Vectorized, keeps the input float dtype."""
+        return np.where(v <= 0.04045, v / 12.92, np.power((v + 0.055) / 1.055, 2.4))
+
+    # Approximate statistics keep roughly this many pixels (regular grid sample)
+    STATS_SAMPLE_PIXELS = 1_000_000
+
+    @staticmethod
+    def _stats_stride(height: int, width: int) -> int:
+        """Grid stride leaving ~STATS_SAMPLE_PIXELS samples (1 = use every pixel)."""
+        return max(1, int(math.sqrt(height * width / ImageAnalyzer.STATS_SAMPLE_PIXELS)))
+
+    @staticmethod
+    def _as_rgb_ndarray(img) -> np.ndarray:
+        """
+        Return img as an (H, W, 3) array, converting PIL modes to RGB if needed.
+        Arrays pass through unchanged; for images the array is cached on
+        img.info['_rgb_array'] so every consumer shares a single conversion.
+        """
+        if isinstance(img, np.ndarray):
+            return img
+        cached = img.info.get('_rgb_array')
+        if cached is not None:
+            return cached
+
+        # PIL Image - convert to RGB if needed (the only mode check; every
+        # other mode, 16-bit greyscale included, goes through one convert)
+        rgb_img = img if img.mode == 'RGB' else img.convert('RGB')
+        img_array = np.asarray(rgb_img)
+
+        img.info['_rgb_array'] = img_array
+        return img_array
 
     @staticmethod
-    def analyze_nonraw_linearized(img) -> Tuple[Dict[str, float], Dict[str, float]]:
+    def analyze_nonraw_linearized(arr, exact: bool = False) -> Tuple[Dict[str, float], Dict[str, float]]:
         """
         For PNG/JPEG etc.: linearize (sRGB -> linear) and scale mean RGB to raw-like
         range so the 5 classifier features match the raw pipeline.
+        Takes the (H, W, 3) array from _as_rgb_ndarray (images are converted).
         Returns (mean_rgb_dict, chromaticity_dict) in same shape as raw path.
+
+        Unless exact=True, large arrays are sampled on a regular grid
+        (every stride-th pixel in both directions, ~STATS_SAMPLE_PIXELS samples).
+        Pixels are picked, never averaged, so every sample is linearized as
+        is: means/stds are unbiased estimates of the full-resolution values,
+        while maxima can come out lower since isolated peaks may be skipped.
         """
-        if isinstance(img, NumpyImageWrapper):
-            img_array = np.array(img)
-        else:
-            if img.mode == 'I;16':
-                img = img.convert('RGB')
-            elif img.mode not in ('RGB', 'I;16B', 'RGB16'):
-                img = img.convert('RGB')
-            img_array = np.array(img)
+        img_array = ImageAnalyzer._as_rgb_ndarray(arr)
+
+        if not exact:
+            stride = ImageAnalyzer._stats_stride(*img_array.shape[:2])
+            if stride > 1:
+                img_array = img_array[::stride, ::stride]
+                logger.debug("Approximate stats: sampling every %dth pixel (%dx%d)", stride, img_array.shape[1], img_array.shape[0])
 
         height, width = img_array.shape[:2]
         total_pixels = height * width
@@ -572,49 +994,51 @@ class ImageAnalyzer:
         # Scale to raw-like range so classifier sees similar values (16-bit scale)
         LINEAR_SCALE = 65535.0
 
-        sum_r = sum_g = sum_b = 0.0
-        sum_r_chrom = sum_g_chrom = 0.0
-        sum_r_chrom_sq = sum_g_chrom_sq = 0.0
-        n_chrom = 0
-        max_r = max_g = max_b = 0.0
-
-        for y in range(height):
-            row = img_array[y].astype(np.float64) / max_val  # 0-1
-            r_lin = ImageAnalyzer._srgb_to_linear(row[:, 0])
-            g_lin = ImageAnalyzer._srgb_to_linear(row[:, 1])
-            b_lin = ImageAnalyzer._srgb_to_linear(row[:, 2])
-
-            sum_r += np.sum(r_lin)
-            sum_g += np.sum(g_lin)
-            sum_b += np.sum(b_lin)
-            max_r = max(max_r, float(np.max(r_lin)))
-            max_g = max(max_g, float(np.max(g_lin)))
-            max_b = max(max_b, float(np.max(b_lin)))
-
-            rgb_sum = r_lin + g_lin + b_lin
-            valid = rgb_sum > 0
-            if np.any(valid):
-                r_chrom = np.where(valid, r_lin / rgb_sum, 0)
-                g_chrom = np.where(valid, g_lin / rgb_sum, 0)
-                sum_r_chrom += np.sum(r_chrom)
-                sum_g_chrom += np.sum(g_chrom)
-                sum_r_chrom_sq += np.sum(r_chrom * r_chrom)
-                sum_g_chrom_sq += np.sum(g_chrom * g_chrom)
-                n_chrom += int(np.sum(valid))
+        if HAVE_LUT_KERNEL and img_array.dtype in (np.uint8, np.uint16):
+            # One parallel pass reading sRGB codes through a linearization
+            # table: no float copies of the pixels at all
+            lut = _srgb_linear_lut(8 * img_array.dtype.itemsize)
+            channel_sum, channel_max, moments, n_chrom = fused_stats(img_array, lut)
+            chrom_sum = np.array(moments[0::2])
+            chrom_sq_sum = np.array(moments[1::2])
+        else:
+            channel_sum = np.zeros(3, dtype=np.float64)
+            channel_max = np.zeros(3, dtype=np.float32)
+            chrom_sum = np.zeros(2, dtype=np.float64)
+            chrom_sq_sum = np.zeros(2, dtype=np.float64)
+            n_chrom = 0
+
+            # Whole-row bands of ~STATS_BLOCK_PIXELS: one reduction per band
+            # instead of a Python iteration (and three np.sum calls) per scanline
+            rows = max(1, ImageAnalyzer.STATS_BLOCK_PIXELS // max(1, width))
+            for y0 in range(0, height, rows):
+                # float32 is ample for 8/16-bit input and halves bandwidth vs float64
+                block = img_array[y0:y0 + rows].reshape(-1, 3).astype(np.float32) / np.float32(max_val)  # 0-1
+                lin = ImageAnalyzer._srgb_to_linear(block)
+                band_sum, band_max = ImageAnalyzer._channel_totals(lin.T, np.float64)
+                channel_sum += band_sum
+                np.maximum(channel_max, band_max, out=channel_max)
+
+                band_sum, band_sq_sum, n_valid = ImageAnalyzer._chromaticity_sums(lin.T)
+                chrom_sum += band_sum
+                chrom_sq_sum += band_sq_sum
+                n_chrom += n_valid
 
         del img_array
 
-        mean_r = sum_r / total_pixels
-        mean_g = sum_g / total_pixels
-        mean_b = sum_b / total_pixels
+        # tolist() hands back Python floats for the response dicts
+        mean_r, mean_g, mean_b = (channel_sum / total_pixels).tolist()
+        max_r, max_g, max_b = channel_max.astype(np.float64).tolist()
+        sum_r_chrom, sum_g_chrom = chrom_sum.tolist()
+        sum_r_chrom_sq, sum_g_chrom_sq = chrom_sq_sum.tolist()
 
         if n_chrom > 0:
             mean_r_chrom = sum_r_chrom / n_chrom
             mean_g_chrom = sum_g_chrom / n_chrom
             var_r = (sum_r_chrom_sq / n_chrom) - (mean_r_chrom ** 2)
             var_g = (sum_g_chrom_sq / n_chrom) - (mean_g_chrom ** 2)
-            std_r = np.sqrt(max(0, var_r))
-            std_g = np.sqrt(max(0, var_g))
+            std_r = math.sqrt(max(0.0, var_r))
+            std_g = math.sqrt(max(0.0, var_g))
         else:
             mean_r_chrom = mean_g_chrom = std_r = std_g = 0.0
 
@@ -626,82 +1050,160 @@ class ImageAnalyzer:
         max_g_scaled = max_g * LINEAR_SCALE
         max_b_scaled = max_b * LINEAR_SCALE
 
-        print(f"✅ Non-RAW linearized: mean RGB (scaled) R={mean_r_scaled:.0f}, G={mean_g_scaled:.0f}, B={mean_b_scaled:.0f}")
-        print(f"   Chromaticity (linear): r={mean_r_chrom:.6f}, g={mean_g_chrom:.6f}")
+        logger.debug("✅ Non-RAW linearized: mean RGB (scaled) R=%.0f, G=%.0f, B=%.0f", mean_r_scaled, mean_g_scaled, mean_b_scaled)
+        logger.debug("   Chromaticity (linear): r=%.6f, g=%.6f", mean_r_chrom, mean_g_chrom)
 
+        # Everything above is already a Python float
         mean_rgb = {
-            'red': float(mean_r_scaled),
-            'green': float(mean_g_scaled),
-            'blue': float(mean_b_scaled),
+            'red': mean_r_scaled,
+            'green': mean_g_scaled,
+            'blue': mean_b_scaled,
         }
         chromaticity = {
-            'meanRChromaticity': float(mean_r_chrom),
-            'meanGChromaticity': float(mean_g_chrom),
-            'stdRChromaticity': float(std_r),
-            'stdGChromaticity': float(std_g),
-            'maxRed': float(max_r_scaled),
-            'maxGreen': float(max_g_scaled),
-            'maxBlue': float(max_b_scaled),
+            'meanRChromaticity': mean_r_chrom,
+            'meanGChromaticity': mean_g_chrom,
+            'stdRChromaticity': std_r,
+            'stdGChromaticity': std_g,
+            'maxRed': max_r_scaled,
+            'maxGreen': max_g_scaled,
+            'maxBlue': max_b_scaled,
         }
         return mean_rgb, chromaticity
 
+    # Pixels per block in the NumPy statistics fallback: each block's float32
+    # working copy (~768 KB) stays in L2 instead of streaming through RAM
+    STATS_BLOCK_PIXELS = 256 * 256
+
     @staticmethod
-    def calculate_mean_rgb(img) -> Dict[str, float]:
+    def _pixel_moments_numpy(img_array: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Tuple[float, float, float, float], int]:
         """
-        Calculate mean RGB values - MEMORY OPTIMIZED
-        Supports PIL Image, NumpyImageWrapper, and both 8-bit and 16-bit images
-        Processes every pixel but uses row-by-row streaming to minimize RAM
+        NumPy fallback for _kernels.fused_stats.
+        Returns (channel_sum, channel_max, (sum_rc, sum_rc_sq, sum_gc, sum_gc_sq), n_chrom).
+
+        Works through the image in bands of whole rows (~STATS_BLOCK_PIXELS
+        each) with reused scratch buffers, accumulating scalars per band.
+        """
+        height, width = img_array.shape[:2]
+        rows = max(1, ImageAnalyzer.STATS_BLOCK_PIXELS // max(1, width))
+        block_pixels = rows * width
+
+        # RGB sums and maxima (exact integer accumulation for 8/16-bit data);
+        # R+G+B stays integer too (3 * 65535 fits int32), so only the two
+        # chromaticity quotients are ever formed in floating point
+        is_integer = np.issubdtype(img_array.dtype, np.integer)
+        acc_dtype = np.uint64 if is_integer else np.float64
+        channel_sum = np.zeros(3, dtype=acc_dtype)
+        channel_max = np.zeros(3, dtype=img_array.dtype)
+        moments = [0.0, 0.0, 0.0, 0.0]
+        n = 0
+
+        rgb_sum = np.empty(block_pixels, dtype=np.int32 if is_integer else np.float32)
+        valid_mask = np.empty(block_pixels, dtype=bool)
+        chrom = np.empty(block_pixels, dtype=np.float32)
+
+        for y0 in range(0, height, rows):
+            block = img_array[y0:y0 + rows].reshape(-1, 3)
+            m = block.shape[0]
+            block_sum, block_max = ImageAnalyzer._channel_totals(block.T, acc_dtype)
+            channel_sum += block_sum
+            np.maximum(channel_max, block_max, out=channel_max)
+
+            # Chromaticity (MATLAB style): x = R/(R+G+B), y = G/(R+G+B)
+            # Only exclude true division-by-zero (R+G+B=0)
+            s = np.add(block[:, 0], block[:, 1], out=rgb_sum[:m], dtype=rgb_sum.dtype)
+            s += block[:, 2]
+            valid = np.greater(s, 0, out=valid_mask[:m])
+            n_valid = int(np.count_nonzero(valid))
+            n += n_valid
+
+            c = chrom[:m]
+            for i, channel in enumerate((0, 1)):
+                np.divide(block[:, channel], s, out=c, where=valid, dtype=np.float32)
+                if n_valid < m:
+                    # Excluded pixels count as 0, so the reductions below need no mask
+                    np.copyto(c, 0, where=~valid)
+                moments[2 * i] += np.sum(c, dtype=np.float64).item()
+                # Fused multiply + reduce, no squared temporary
+                moments[2 * i + 1] += np.einsum('i,i->', c, c, dtype=np.float64).item()
+
+        return channel_sum, channel_max, tuple(moments), n
+
+    @staticmethod
+    def _compute_stats(img_array: np.ndarray) -> Dict[str, Any]:
+        """
+        Single-pass RGB + chromaticity statistics shared by calculate_mean_rgb
+        and calculate_chromaticity_values.
+
+        - channel sums/maxima are taken straight from the integer pixel data
+          (uint64 accumulator, no float copy)
+        - R+G+B is summed in int32 and chromaticity divided straight to float32
+        - mean/std come from sum(x) and sum(x^2), no boolean-indexed copies
+        - with numba installed, all of the above runs as one parallel kernel
+          (_kernels.fused_stats) that never materializes float intermediates
+
+        Use calculate_all_stats to get both public results from one pass.
         """
-        # Get image as numpy array (works for both PIL and NumpyImageWrapper)
-        if isinstance(img, NumpyImageWrapper):
-            img_array = np.array(img)
-        else:
-            # PIL Image - convert to RGB if needed
-            if img.mode == 'I;16':
-                img = img.convert('RGB')
-            elif img.mode not in ('RGB', 'I;16B', 'RGB16'):
-                img = img.convert('RGB')
-            img_array = np.array(img)
-        
         height, width = img_array.shape[:2]
         total_pixels = height * width
-        
-        # Detect bit depth from array dtype
         bit_depth = 16 if img_array.dtype == np.uint16 else 8
-        
-        print(f"Image dimensions: {width}x{height} ({total_pixels} total pixels)")
-        print(f"🎨 Bit depth: {bit_depth}-bit (dtype: {img_array.dtype})")
-        print(f"🧠 Using memory-optimized row-by-row processing")
-        
-        # Process row by row to minimize memory usage
-        sum_red = 0.0
-        sum_green = 0.0
-        sum_blue = 0.0
-        
-        # Process each row (keeps only one row as float64 at a time)
-        for y in range(height):
-            row = img_array[y].astype(np.float64)  # Convert one row at a time
-            sum_red += np.sum(row[:, 0])
-            sum_green += np.sum(row[:, 1])
-            sum_blue += np.sum(row[:, 2])
-        
-        del img_array  # Free memory immediately
-        
-        mean_red = sum_red / total_pixels
-        mean_green = sum_green / total_pixels
-        mean_blue = sum_blue / total_pixels
-        
-        print(f"✅ COMPLETED: Processed all {total_pixels} pixels ({bit_depth}-bit)")
-        print(f"Mean RGB: R={mean_red:.2f}, G={mean_green:.2f}, B={mean_blue:.2f}")
-        
-        return {
-            'red': float(mean_red),
-            'green': float(mean_green),
-            'blue': float(mean_blue)
+
+        if HAVE_NUMBA:
+            channel_sum, channel_max, moments, n = fused_stats(img_array)
+        else:
+            channel_sum, channel_max, moments, n = ImageAnalyzer._pixel_moments_numpy(img_array)
+
+        if n > 0:
+            sum_r, sum_r_sq, sum_g, sum_g_sq = moments
+            mean_r = sum_r / n
+            mean_g = sum_g / n
+            # Variance = E[X^2] - E[X]^2, clamped for numerical precision
+            std_r = math.sqrt(max(0.0, sum_r_sq / n - mean_r * mean_r))
+            std_g = math.sqrt(max(0.0, sum_g_sq / n - mean_g * mean_g))
+        else:
+            mean_r = mean_g = std_r = std_g = 0.0
+
+        stats = {
+            'width': int(width),
+            'height': int(height),
+            'bit_depth': bit_depth,
+            'total_pixels': int(total_pixels),
+            'valid_chromaticity': n,
+            'mean_rgb': {
+                'red': channel_sum[0].item() / total_pixels,
+                'green': channel_sum[1].item() / total_pixels,
+                'blue': channel_sum[2].item() / total_pixels,
+            },
+            'chromaticity': {
+                'meanRChromaticity': mean_r,
+                'meanGChromaticity': mean_g,
+                'stdRChromaticity': std_r,
+                'stdGChromaticity': std_g,
+                'maxRed': float(channel_max[0].item()),
+                'maxGreen': float(channel_max[1].item()),
+                'maxBlue': float(channel_max[2].item()),
+            },
         }
+        return stats
+
+    @staticmethod
+    def calculate_mean_rgb(arr) -> Dict[str, float]:
+        """
+        Calculate mean RGB values - MEMORY OPTIMIZED
+        Takes the (H, W, 3) array from _as_rgb_ndarray (PIL Images are
+        still accepted), 8-bit or 16-bit
+        Processes every pixel in a single fused pass (see _compute_stats)
+        """
+        stats = ImageAnalyzer._compute_stats(ImageAnalyzer._as_rgb_ndarray(arr))
+        mean_rgb = stats['mean_rgb']
+
+        logger.debug("Image dimensions: %dx%d (%d total pixels)", stats['width'], stats['height'], stats['total_pixels'])
+        logger.debug("✅ COMPLETED: Processed all %d pixels (%d-bit)", stats['total_pixels'], stats['bit_depth'])
+        logger.debug("Mean RGB: R=%.2f, G=%.2f, B=%.2f", mean_rgb['red'], mean_rgb['green'], mean_rgb['blue'])
+
+        return dict(mean_rgb)
     
     @staticmethod
-    def calculate_chromaticity_values(img) -> Dict[str, float]:
+    def calculate_chromaticity_values(arr) -> Dict[str, float]:
         """
         Calculate chromaticity values - MATLAB COMPATIBLE
         
@@ -714,126 +1216,74 @@ class ImageAnalyzer:
         Uses one-pass algorithm for memory efficiency:
         - mean = sum(x) / n
         - std = sqrt(sum(x^2)/n - mean^2)
+        Takes the array from _as_rgb_ndarray (images are converted).
         """
-        # Get image as numpy array (works for both PIL and NumpyImageWrapper)
-        if isinstance(img, NumpyImageWrapper):
-            img_array = np.array(img)
-        else:
-            # PIL Image - convert to RGB if needed
-            if img.mode == 'I;16':
-                img = img.convert('RGB')
-            elif img.mode not in ('RGB', 'I;16B', 'RGB16'):
-                img = img.convert('RGB')
-            img_array = np.array(img)
-        
-        height, width = img_array.shape[:2]
-        total_pixels = height * width
-        
-        # Detect bit depth from array dtype
-        bit_depth = 16 if img_array.dtype == np.uint16 else 8
-        
-        print(f"Chromaticity analysis for {width}x{height} ({total_pixels} pixels)")
-        print(f"🎨 Bit depth: {bit_depth}-bit (dtype: {img_array.dtype})")
-        print(f"🧠 Using MATLAB-compatible one-pass algorithm")
-        
-        # One-pass statistics accumulators
-        sum_r_chrom = 0.0
-        sum_g_chrom = 0.0
-        sum_r_chrom_sq = 0.0
-        sum_g_chrom_sq = 0.0
-        n = 0  # Count of valid chromaticity samples
-        
-        max_red = 0.0
-        max_green = 0.0
-        max_blue = 0.0
-        
-        # Process row by row (memory efficient)
-        for y in range(height):
-            # Convert single row to float64 for precision
-            row = img_array[y].astype(np.float64)
-            r = row[:, 0]
-            g = row[:, 1]
-            b = row[:, 2]
-            
-            # Update max values
-            row_max_r = np.max(r)
-            row_max_g = np.max(g)
-            row_max_b = np.max(b)
-            if row_max_r > max_red: max_red = row_max_r
-            if row_max_g > max_green: max_green = row_max_g
-            if row_max_b > max_blue: max_blue = row_max_b
-            
-            # Calculate chromaticity for this row (MATLAB style)
-            # MATLAB: chromaticity_x = R ./ (R+G+B)
-            rgb_sum = r + g + b
-            
-            # Only exclude true division-by-zero (R+G+B=0), match MATLAB behavior
-            valid_mask = rgb_sum > 0
-            
-            if np.any(valid_mask):
-                r_valid = r[valid_mask]
-                g_valid = g[valid_mask]
-                rgb_sum_valid = rgb_sum[valid_mask]
-                
-                r_chrom = r_valid / rgb_sum_valid
-                g_chrom = g_valid / rgb_sum_valid
-                
-                # Accumulate sums (vectorized - fast!)
-                sum_r_chrom += np.sum(r_chrom)
-                sum_g_chrom += np.sum(g_chrom)
-                sum_r_chrom_sq += np.sum(r_chrom * r_chrom)
-                sum_g_chrom_sq += np.sum(g_chrom * g_chrom)
-                n += len(r_chrom)
-        
-        del img_array  # Free memory immediately
-        
-        # Calculate final statistics (MATLAB style)
-        if n > 0:
-            mean_r = sum_r_chrom / n
-            mean_g = sum_g_chrom / n
-            # Variance = E[X^2] - E[X]^2
-            var_r = (sum_r_chrom_sq / n) - (mean_r * mean_r)
-            var_g = (sum_g_chrom_sq / n) - (mean_g * mean_g)
-            # Clamp to 0 to handle numerical precision issues
-            std_r = np.sqrt(max(0, var_r))
-            std_g = np.sqrt(max(0, var_g))
-        else:
-            mean_r = mean_g = std_r = std_g = 0.0
-        
-        print(f"✅ COMPLETED: Chromaticity analysis finished ({bit_depth}-bit)")
-        print(f"Max RGB values: R={max_red}, G={max_green}, B={max_blue}")
-        print(f"Valid chromaticity samples: {n} / {total_pixels}")
-        print(f"Chromaticity means: R={mean_r:.6f}, G={mean_g:.6f}")
-        print(f"Chromaticity std devs: R={std_r:.6f}, G={std_g:.6f}")
-        
-        return {
-            'meanRChromaticity': float(mean_r),
-            'meanGChromaticity': float(mean_g),
-            'stdRChromaticity': float(std_r),
-            'stdGChromaticity': float(std_g),
-            'maxRed': float(max_red),
-            'maxGreen': float(max_green),
-            'maxBlue': float(max_blue),
-        }
+        stats = ImageAnalyzer._compute_stats(ImageAnalyzer._as_rgb_ndarray(arr))
+        chromaticity = stats['chromaticity']
+
+        logger.debug("✅ COMPLETED: Chromaticity analysis finished (%d-bit)", stats['bit_depth'])
+        logger.debug("Max RGB values: R=%s, G=%s, B=%s", chromaticity['maxRed'], chromaticity['maxGreen'], chromaticity['maxBlue'])
+        logger.debug("Valid chromaticity samples: %d / %d", stats['valid_chromaticity'], stats['total_pixels'])
+        logger.debug("Chromaticity means: R=%.6f, G=%.6f", chromaticity['meanRChromaticity'], chromaticity['meanGChromaticity'])
+        logger.debug("Chromaticity std devs: R=%.6f, G=%.6f", chromaticity['stdRChromaticity'], chromaticity['stdGChromaticity'])
+
+        return dict(chromaticity)
+
+    @staticmethod
+    def calculate_all_stats(arr) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """
+        calculate_mean_rgb and calculate_chromaticity_values in one call:
+        the array is materialized once and traversed once.
+        Returns (mean_rgb_dict, chromaticity_dict).
+        """
+        stats = ImageAnalyzer._compute_stats(ImageAnalyzer._as_rgb_ndarray(arr))
+        logger.debug("✅ COMPLETED: RGB + chromaticity stats for %dx%d (%d-bit)", stats['width'], stats['height'], stats['bit_depth'])
+        return dict(stats['mean_rgb']), dict(stats['chromaticity'])
     
     @staticmethod
-    def extract_exif_data(file_bytes: bytes) -> Dict[str, Any]:
-        """Extract EXIF data from image"""
+    def extract_exif_data(exif: Optional[Image.Exif], stream: Optional[BinaryIO] = None) -> Dict[str, Any]:
+        """
+        Extract EXIF data as a flat dict with exifread-style keys.
+        Uses the Exif block Pillow already parsed in decode_image; only when
+        Pillow found nothing (e.g. RAW files) is the file stream parsed, by
+        exifread for the full tag list the client shows.
+        stream is read in place (the spooled upload or a file handle on it);
+        exifread only seeks to the header and IFDs, never copying the file.
+        Values are kept as parsed (IFDRational, exifread tags, ...); use
+        _exif_to_json to stringify them for the response.
+        """
         exif_dict = {}
-        
+
+        if exif is not None and len(exif) > 0:
+            tables, ignored = _exifread_tables()
+            for ifd, prefix in _EXIF_IFDS:
+                entries = exif if ifd is None else exif.get_ifd(ifd)
+                for tag, value in entries.items():
+                    if tag in ignored:
+                        continue
+                    entry = tables[prefix].get(tag)
+                    name = entry[0] if entry else 'Tag 0x%04X' % tag
+                    exif_dict[f"{prefix} {name}"] = value
+            logger.debug("Extracted %d EXIF tags (Pillow)", len(exif_dict))
+            return exif_dict
+
+        if stream is None:
+            return exif_dict
+
         try:
-            # Use exifread to extract EXIF data
-            tags = exifread.process_file(io.BytesIO(file_bytes), details=False)
+            # Use exifread to extract EXIF data (only needed when Pillow has none)
+            import exifread
+            stream.seek(0)
+            tags = exifread.process_file(stream, details=False)
             
             # Convert tags to dictionary
             for tag, value in tags.items():
-                # Convert IfdTag values to strings
-                exif_dict[tag] = str(value)
+                exif_dict[tag] = value
             
-            print(f"Extracted {len(exif_dict)} EXIF tags")
+            logger.debug("Extracted %d EXIF tags", len(exif_dict))
             
         except Exception as e:
-            print(f"EXIF extraction error: {e}")
+            logger.warning("EXIF extraction error: %s", e)
         
         return exif_dict
     
@@ -842,55 +1292,22 @@ class ImageAnalyzer:
         """Extract and calculate photographic values from EXIF"""
         
         # Extract ISO
-        iso = None
-        for key in ['EXIF ISOSpeedRatings', 'ISOSpeedRatings', 'ISO']:
-            if key in exif_data:
-                try:
-                    iso = int(exif_data[key])
-                    break
-                except:
-                    pass
-        
-        # Extract F-Number
-        f_number = None
-        for key in ['EXIF FNumber', 'FNumber', 'F-Number']:
-            if key in exif_data:
-                try:
-                    value = exif_data[key]
-                    # Handle fraction format like "28/10"
-                    if '/' in str(value):
-                        parts = str(value).split('/')
-                        f_number = float(parts[0]) / float(parts[1])
-                    else:
-                        f_number = float(value)
-                    break
-                except:
-                    pass
-        
-        # Extract Exposure Time
-        exposure_time = None
-        for key in ['EXIF ExposureTime', 'ExposureTime']:
-            if key in exif_data:
-                try:
-                    value = exif_data[key]
-                    # Handle fraction format like "1/60"
-                    if '/' in str(value):
-                        parts = str(value).split('/')
-                        exposure_time = float(parts[0]) / float(parts[1])
-                    else:
-                        exposure_time = float(value)
-                    break
-                except:
-                    pass
-        
+        iso = _exif_number(exif_data, _ISO_KEYS)
+        if iso is not None:
+            iso = int(iso)
+
+        # Extract F-Number and Exposure Time (rationals like 28/10, 1/60)
+        f_number = _exif_number(exif_data, _FNUMBER_KEYS)
+        exposure_time = _exif_number(exif_data, _EXPOSURE_TIME_KEYS)
+
         # Calculate photographic values
         sv = PhotograpicCalculations.calculate_sv(iso)
         av = PhotograpicCalculations.calculate_av(f_number)
         tv = PhotograpicCalculations.calculate_tv(exposure_time)
         bv = PhotograpicCalculations.calculate_bv(av, tv, sv)
         
-        print(f"EXIF Data: ISO={iso}, FNumber={f_number}, ExposureTime={exposure_time}")
-        print(f"Calculated: S_v={sv}, A_v={av}, T_v={tv}, B_v={bv}")
+        logger.debug("EXIF Data: ISO=%s, FNumber=%s, ExposureTime=%s", iso, f_number, exposure_time)
+        logger.debug("Calculated: S_v=%s, A_v=%s, T_v=%s, B_v=%s", sv, av, tv, bv)
         
         return {
             'sV': sv,
@@ -910,59 +1327,75 @@ async def root():
     }
 
 
-async def _analyze_file(file: UploadFile) -> Dict[str, Any]:
+# Analyses allowed to run at once. Each holds a decoded image (or RAW frame)
+# plus scratch buffers, so unbounded concurrency would overrun the 512MB
+# limit; further requests wait their turn.
+_ANALYSIS_SLOTS = asyncio.Semaphore(max(1, int(os.environ.get("MAX_CONCURRENT_ANALYSES", "1"))))
+
+
+async def _analyze_file(file: UploadFile, exact: bool = False, binned: bool = False) -> Dict[str, Any]:
     """
     Run full image analysis. Returns response dict matching Flutter ImageAnalysis.
     Used by both /api/analyze and /api/analyze-and-classify.
+    exact=True disables sampled statistics on large images; binned=True
+    takes RAW statistics over 2x2 Bayer quads instead of demosaiced pixels.
+
+    The CPU-bound work runs in a worker thread so the event loop keeps
+    serving other requests (NumPy releases the GIL in its reductions), at
+    most MAX_CONCURRENT_ANALYSES (default 1) at a time.
     """
+    async with _ANALYSIS_SLOTS:
+        # Work on the upload's spooled file directly instead of copying it
+        # into a bytes object (and again into a BytesIO)
+        return await asyncio.to_thread(_do_analysis, file.file, file.filename or "unknown", exact, binned)
+
+
+def _do_analysis(stream: BinaryIO, filename: str, exact: bool = False, binned: bool = False) -> Dict[str, Any]:
+    """Synchronous body of _analyze_file: decode, EXIF, statistics, response dict."""
     img = None
-    file_bytes = None
 
     try:
-        file_bytes = await file.read()
-        file_size = len(file_bytes)
-        filename = file.filename or "unknown"
-
-        print(f"\n=== Analyzing {filename} ({file_size} bytes) ===")
-        print(f"🧠 Memory limit: 512MB - using optimized processing")
+        stream.seek(0, io.SEEK_END)
+        file_size = stream.tell()
+        stream.seek(0)
 
-        exif_data = ImageAnalyzer.extract_exif_data(file_bytes)
-        photographic_values = ImageAnalyzer.extract_photographic_values(exif_data)
+        logger.info("=== Analyzing %s (%d bytes) ===", filename, file_size)
+        logger.debug("🧠 Memory limit: 512MB - using optimized processing")
 
-        raw_extensions = ('.dng', '.raw', '.cr2', '.nef', '.arw', '.rw2', '.orf', '.pef')
-        is_raw = filename.lower().endswith(raw_extensions)
+        extension = _file_extension(filename)
+        is_raw = extension in RAW_EXTENSIONS
 
         if is_raw:
-            print(f"🎯 RAW file detected - using streaming MATLAB-compatible analysis")
-            analysis = ImageAnalyzer.matlab_compatible_streaming_analysis(file_bytes)
+            logger.debug("🎯 RAW file detected - using streaming MATLAB-compatible analysis")
+            # EXIF is parsed from the header on a worker (own file handle) while
+            # LibRaw decodes the sensor data, which releases the GIL
+            with _raw_upload_path(stream) as raw_path:
+                exif_future = _EXIF_EXECUTOR.submit(_read_raw_exif, raw_path)
+                analysis = ImageAnalyzer.matlab_compatible_streaming_analysis(raw_path, exact=exact, binned=binned)
+                exif_data = exif_future.result()
             img_width = analysis['width']
             img_height = analysis['height']
             rgb_values = analysis['mean_rgb']
             chromaticity_values = analysis['chromaticity']
-            del file_bytes
-            file_bytes = None
-            gc.collect()
         else:
-            img = ImageAnalyzer.decode_image(file_bytes, filename)
-            img_width, img_height = img.size
-            del file_bytes
-            file_bytes = None
-            gc.collect()
+            img, exif = ImageAnalyzer.decode_image(stream, filename)
+            if isinstance(img, np.ndarray):
+                img_height, img_width = img.shape[:2]
+            else:
+                img_width, img_height = img.size
+            exif_data = ImageAnalyzer.extract_exif_data(exif, stream)
+            del exif
+            # Convert once; all pixel statistics work on this array
+            arr = ImageAnalyzer._as_rgb_ndarray(img)
             # Linearize (sRGB -> linear) and scale to raw-like range so classifier features match RAW pipeline
-            rgb_values, chromaticity_values = ImageAnalyzer.analyze_nonraw_linearized(img)
-            del img
+            rgb_values, chromaticity_values = ImageAnalyzer.analyze_nonraw_linearized(arr, exact=exact)
+            del img, arr
             img = None
-            gc.collect()
-
-        file_extension = filename.split('.')[-1].upper() if '.' in filename else 'UNKNOWN'
-        if file_size < 1024:
-            file_size_str = f"{file_size} B"
-        elif file_size < 1024 * 1024:
-            file_size_str = f"{file_size / 1024:.1f} KB"
-        elif file_size < 1024 * 1024 * 1024:
-            file_size_str = f"{file_size / (1024 * 1024):.1f} MB"
-        else:
-            file_size_str = f"{file_size / (1024 * 1024 * 1024):.1f} GB"
+
+        photographic_values = ImageAnalyzer.extract_photographic_values(exif_data)
+
+        file_extension = extension.upper() or 'UNKNOWN'
+        file_size_str = _format_file_size(file_size)
 
         parsed_lamp = PhotograpicCalculations.parse_lamp_from_filename(filename)
         mean_r = float(rgb_values['red'])
@@ -970,7 +1403,7 @@ async def _analyze_file(file: UploadFile) -> Dict[str, Any]:
         mean_b = float(rgb_values['blue'])
         is_valid, validation_error = PhotograpicCalculations.check_intensity_acceptable(mean_r, mean_g, mean_b)
         if not is_valid:
-            print(f"⚠️ Reject (intensity): {filename} — {validation_error}")
+            logger.info("⚠️ Reject (intensity): %s — %s", filename, validation_error)
 
         response = {
             "fileName": filename,
@@ -984,7 +1417,7 @@ async def _analyze_file(file: UploadFile) -> Dict[str, Any]:
             "maxRed": chromaticity_values['maxRed'],
             "maxGreen": chromaticity_values['maxGreen'],
             "maxBlue": chromaticity_values['maxBlue'],
-            "exifData": exif_data,
+            "exifData": _exif_to_json(exif_data),
             "analysisDate": datetime.now().isoformat(),
             "fileSize": file_size_str,
             "imageFormat": file_extension,
@@ -998,41 +1431,50 @@ async def _analyze_file(file: UploadFile) -> Dict[str, Any]:
             "isValid": is_valid,
             "validationError": validation_error,
         }
-        print(f"✅ Analysis complete for {filename}")
-        gc.collect()
+        logger.info("✅ Analysis complete for %s", filename)
         return response
 
     finally:
         if img is not None:
             del img
-        if file_bytes is not None:
-            del file_bytes
-        gc.collect()
+
+
+# EXIF parsing that overlaps with RAW decoding in _do_analysis
+_EXIF_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="uvsn-exif")
+
+
+def _read_raw_exif(path: str) -> Dict[str, Any]:
+    """extract_exif_data for a RAW file on disk, through its own file handle."""
+    with open(path, 'rb') as f:
+        return ImageAnalyzer.extract_exif_data(None, f)
 
 
 @app.post("/api/analyze")
-async def analyze_image(file: UploadFile = File(...)):
+async def analyze_image(file: UploadFile = File(...), exact: bool = False, binned: bool = False):
     """
     Analyze image and return RGB, chromaticity, and EXIF data
     Memory-optimized to work within 512MB RAM limit
     RAW files use streaming analysis (never materializes full RGB array)
+    Pass ?exact=true to compute statistics over every pixel (large images are sampled by default)
+    Pass ?binned=true for fast RAW statistics over 2x2 Bayer quads (no demosaic)
     """
     try:
-        response = await _analyze_file(file)
+        response = await _analyze_file(file, exact=exact, binned=binned)
         return JSONResponse(content=response)
     except Exception as e:
-        print(f"❌ Error analyzing image: {str(e)}")
+        logger.error("❌ Error analyzing image: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to analyze image: {str(e)}")
 
 
 @app.post("/api/analyze-and-classify")
-async def analyze_and_classify(file: UploadFile = File(...)):
+async def analyze_and_classify(file: UploadFile = File(...), exact: bool = False, binned: bool = False):
     """
-    Analyze image (same as /api/analyze) then run Random Forest classifier
-    to predict which lamp the image is from. Response includes predictedLamp.
+    Analyze image (same as /api/analyze, same exact/binned options) then run
+    Random Forest classifier to predict which lamp the image is from.
+    Response includes predictedLamp.
     """
     try:
-        response = await _analyze_file(file)
+        response = await _analyze_file(file, exact=exact, binned=binned)
         try:
             clf = _get_lamp_classifier()
             X = _analysis_to_feature_vector(response)
@@ -1049,13 +1491,13 @@ async def analyze_and_classify(file: UploadFile = File(...)):
                 )
         except FileNotFoundError as e:
             response["predictedLampError"] = "Classifier model not available"
-            print(f"Classifier not loaded: {e}")
+            logger.warning("Classifier not loaded: %s", e)
         except Exception as e:
             response["predictedLampError"] = str(e)
-            print(f"Classification error: {e}")
+            logger.warning("Classification error: %s", e)
         return JSONResponse(content=response)
     except Exception as e:
-        print(f"❌ Error in analyze-and-classify: {str(e)}")
+        logger.error("❌ Error in analyze-and-classify: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to analyze image: {str(e)}")
 
 
@@ -12,7 +12,6 @@ Usage:
 Requires: rawpy, numpy. For 16-bit PNG output: pypng (pip install pypng).
 """
 
-import io
 import os
 import sys
 
@@ -97,32 +96,32 @@ def _demosaic_strip(cfa: np.ndarray, pattern: np.ndarray, r_pos: tuple, b_pos: t
     return rgb
 
 
-def _matlab_compatible_raw_decode(file_bytes: bytes) -> np.ndarray:
+def _matlab_compatible_raw_decode(file_path: str) -> np.ndarray:
     """
     Decode RAW (DNG, etc.) to float32 RGB using the same pipeline as the
     analyzer: black-level correction + bilinear demosaic. No WB, no gamma.
     """
-    with rawpy.imread(io.BytesIO(file_bytes)) as raw:
-        cfa = raw.raw_image_visible.astype(np.int32)
-        height, width = cfa.shape
-        black_levels = np.array(raw.black_level_per_channel, dtype=np.int32)
+    with rawpy.imread(file_path) as raw:
+        # astype copies the CFA view once; everything after works in place on it
+        cfa = raw.raw_image_visible.astype(np.float32)
+        black_levels = np.array(raw.black_level_per_channel, dtype=np.float32)
         pattern = raw.raw_pattern
         r_pos = tuple(np.argwhere(pattern == 0)[0])
         b_pos = tuple(np.argwhere(pattern == 2)[0])
 
         for i in range(2):
             for j in range(2):
-                channel = pattern[i, j]
-                cfa[i::2, j::2] -= black_levels[channel]
-        cfa = np.maximum(0, cfa)
+                site = cfa[i::2, j::2]
+                np.subtract(site, black_levels[pattern[i, j]], out=site)
+                np.maximum(site, 0, out=site)
 
-        rgb_float = _demosaic_strip(cfa.astype(np.float32), pattern, r_pos, b_pos, 0)
+        rgb_float = _demosaic_strip(cfa, pattern, r_pos, b_pos, 0)
         return rgb_float
 
 
-def _rawpy_fallback(file_bytes: bytes) -> np.ndarray:
+def _rawpy_fallback(file_path: str) -> np.ndarray:
     """Same params as analyze.py fallback: 16-bit linear, no WB, raw color."""
-    with rawpy.imread(io.BytesIO(file_bytes)) as raw:
+    with rawpy.imread(file_path) as raw:
         rgb = raw.postprocess(
             output_bps=16,
             use_camera_wb=False,
@@ -140,11 +139,9 @@ def dng_to_rgb(file_path: str) -> tuple[np.ndarray, bool]:
     Load DNG (or RAW) and return RGB array (uint16, 0–65535) and whether
     the MATLAB-compatible path was used (True) or rawpy fallback (False).
     """
-    with open(file_path, "rb") as f:
-        file_bytes = f.read()
-
+    # rawpy reads straight from the path (a file object would be read into memory first)
     try:
-        rgb_float = _matlab_compatible_raw_decode(file_bytes)
+        rgb_float = _matlab_compatible_raw_decode(file_path)
         max_val = float(np.max(rgb_float))
         if max_val <= 0:
             max_val = 1.0
@@ -152,7 +149,7 @@ def dng_to_rgb(file_path: str) -> tuple[np.ndarray, bool]:
         rgb16 = (rgb_float * scale).clip(0, 65535).astype(np.uint16)
         return rgb16, True
     except Exception:
-        rgb16 = _rawpy_fallback(file_bytes)
+        rgb16 = _rawpy_fallback(file_path)
         return rgb16, False
 
 
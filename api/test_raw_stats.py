@@ -0,0 +1,63 @@
+"""
+RAW statistics backends must agree: the fused numba demosaic+stats kernel
+and the NumPy strip demosaic it replaces.
+
+Run with: python -m pytest test_raw_stats.py
+"""
+
+import numpy as np
+import pytest
+
+rawpy = pytest.importorskip("rawpy")
+
+import analyze
+from analyze import ImageAnalyzer
+
+PATTERNS = {
+    'RGGB': [[0, 1], [3, 2]],
+    'BGGR': [[2, 3], [1, 0]],
+    'GRBG': [[1, 0], [2, 3]],
+    'GBRG': [[3, 2], [0, 1]],
+}
+
+
+class FakeRaw:
+    """The parts of rawpy.RawPy matlab_compatible_streaming_analysis reads."""
+
+    def __init__(self, cfa, pattern):
+        self.raw_image_visible = cfa.copy()
+        self.black_level_per_channel = [512, 510, 508, 512]
+        self.raw_pattern = np.array(pattern, dtype=np.uint8)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _analyze(monkeypatch, cfa, pattern, fused, exact):
+    monkeypatch.setattr(rawpy, 'imread', lambda path: FakeRaw(cfa, pattern))
+    monkeypatch.setattr(analyze, 'HAVE_DEMOSAIC_STATS_KERNEL', fused)
+    return ImageAnalyzer.matlab_compatible_streaming_analysis('fake.dng', exact=exact)
+
+
+@pytest.mark.skipif(not analyze.HAVE_DEMOSAIC_STATS_KERNEL, reason="needs numba")
+@pytest.mark.parametrize('pattern', PATTERNS)
+@pytest.mark.parametrize('shape', [(300, 400), (301, 401), (257, 258)])
+@pytest.mark.parametrize('exact', [True, False])
+def test_fused_kernel_matches_numpy_strips(monkeypatch, pattern, shape, exact):
+    # Small enough a sample budget that exact=False strides over the strips
+    monkeypatch.setattr(ImageAnalyzer, 'RAW_SAMPLE_PIXELS', 20_000)
+    rng = np.random.default_rng(sum(shape))
+    cfa = (rng.integers(0, 4000, size=shape) + 512).astype(np.uint16)
+    cfa[10:20, 10:20] = 0
+    # Bright frame edges: neighbour wrap-around must match too
+    cfa[0] = cfa[-1] = 4095
+
+    fused = _analyze(monkeypatch, cfa, PATTERNS[pattern], True, exact)
+    strips = _analyze(monkeypatch, cfa, PATTERNS[pattern], False, exact)
+
+    for key in ('mean_rgb', 'chromaticity'):
+        for name, value in strips[key].items():
+            assert fused[key][name] == pytest.approx(value, rel=1e-5), f"{key}.{name}"